@@ -0,0 +1,251 @@
+"""Offline benchmarks for the cut, thumbnail and web app hot paths.
+
+Synthetic videos are generated locally with ffmpeg, so no network access is
+needed. Results are written as JSON and can be compared across commits:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from moviepy.config import FFMPEG_BINARY
+
+from mytube.process import ThumbnailGenerator, VideoCutter
+from mytube.web_app import WebApp
+
+
+def make_video(path: str, duration: int, size: str = "640x360"):
+    """Write a synthetic H.264/AAC test video with a keyframe every 2 seconds."""
+    cmd = [
+        FFMPEG_BINARY,
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc=duration={duration}:size={size}:rate=25",
+        "-f",
+        "lavfi",
+        "-i",
+        f"sine=frequency=440:duration={duration}",
+        "-c:v",
+        "libx264",
+        "-g",
+        "50",
+        "-c:a",
+        "aac",
+        "-shortest",
+        path,
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def write_csv(path: str, n_clips: int, clip_length: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Start_min,Start_sec,End_min,End_sec,Name\n")
+        for i in range(n_clips):
+            start = i * clip_length
+            end = start + clip_length
+            f.write(f"{start // 60},{start % 60},{end // 60},{end % 60},clip{i}\n")
+
+
+def timed(fn, repeat: int = 1) -> dict:
+    """Run ``fn`` ``repeat`` times and return timing statistics in seconds."""
+    samples = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t_start)
+    return {
+        "mean": statistics.fmean(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "repeat": repeat,
+    }
+
+
+def bench_cut(workdir: str, n_clips: int, clip_length: int) -> dict:
+    videos_dir = os.path.join(workdir, "videos")
+    os.makedirs(videos_dir, exist_ok=True)
+    source = os.path.join(videos_dir, "source.mp4")
+    make_video(source, n_clips * clip_length)
+    write_csv(source.replace(".mp4", ".csv"), n_clips, clip_length)
+    results = {}
+    for mode in VideoCutter.MODES:
+        cutter = VideoCutter(source, mode=mode)
+        stats = timed(cutter.process_intervals)
+        stats["clips_per_second"] = n_clips / stats["mean"]
+        results[mode] = stats
+    return results
+
+
+def bench_thumbnails(workdir: str, n_targets: int) -> dict:
+    source = os.path.join(workdir, "thumbs.mp4")
+    make_video(source, n_targets * 4, size="1280x720")
+    out_dir = os.path.join(workdir, "thumbnails")
+    results = {}
+    for samples in (1, 8):
+        targets = [
+            (i * 4.0, i * 4.0 + 4, os.path.join(out_dir, f"t{samples}_{i}.jpg"))
+            for i in range(n_targets)
+        ]
+        stats = timed(lambda: ThumbnailGenerator.batch(source, targets, samples))
+        stats["per_thumbnail"] = stats["mean"] / n_targets
+        results[f"samples_{samples}"] = stats
+    clip = os.path.join(workdir, "clip.mp4")
+    shutil.copy(source, clip)
+    results["single_run"] = timed(lambda: ThumbnailGenerator.run(clip), repeat=3)
+    return results
+
+
+def make_library(folder: str, n_files: int):
+    thumbnails = os.path.join(folder, "thumbnails")
+    os.makedirs(thumbnails, exist_ok=True)
+    for i in range(n_files):
+        open(os.path.join(folder, f"clip{i:06d}.mp4"), "wb").close()
+        open(os.path.join(thumbnails, f"clip{i:06d}.jpg"), "wb").close()
+
+
+def bench_webapp(workdir: str, library_size: int, n_events: int) -> dict:
+    folder = os.path.join(workdir, "library")
+    make_library(folder, library_size)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        index_path = os.path.join(folder, "library.sqlite")
+
+        def cold_start():
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            WebApp(processed_videos_folder=folder, watch=False).close()
+
+        def warm_start():
+            WebApp(processed_videos_folder=folder, watch=False).close()
+
+        results = {
+            "startup_without_index": timed(cold_start, repeat=3),
+            "startup_with_index": timed(warm_start, repeat=3),
+        }
+        app = WebApp(processed_videos_folder=folder, watch=False)
+        try:
+
+            class Event:
+                index = 1
+                _data = {}
+
+            def select():
+                list(app.select_thumbnail(Event(), 0, 4, [], 0))
+                app.undo_last_video(1, [], 4)
+
+            results["events"] = {
+                "select_and_undo": timed(select, repeat=n_events),
+                "update_max_videos": timed(
+                    lambda: app.update_max_videos(5, 0, []), repeat=n_events
+                ),
+                "change_page": timed(lambda: app.change_page(0, 1), repeat=n_events),
+                "progress_plot": timed(
+                    lambda: app.gen_progress_plot(4, 2), repeat=n_events
+                ),
+                "page_load": timed(app._prepare_state_payload, repeat=n_events),
+            }
+        finally:
+            # Write the state before the temporary folder is removed
+            app.close()
+        return results
+    finally:
+        os.chdir(cwd)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif key == "mean":
+            flat[prefix.rstrip(".")] = value
+    return flat
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = flatten(baseline["results"])
+    new = flatten(current["results"])
+    print(f"{'benchmark (mean ms)':50} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name in sorted(new.keys() & old.keys()):
+        ratio = new[name] / old[name] if old[name] else float("nan")
+        print(
+            f"{name:50} {old[name] * 1e3:10.3f} {new[name] * 1e3:10.3f} {ratio:7.2f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Baseline JSON file to compare with")
+    parser.add_argument("--clips", type=int, default=8)
+    parser.add_argument("--clip-length", type=int, default=5)
+    parser.add_argument("--thumbnails", type=int, default=8)
+    parser.add_argument("--library-size", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument(
+        "--only",
+        nargs="*",
+        choices=["cut", "thumbnails", "webapp"],
+        default=["cut", "thumbnails", "webapp"],
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if "cut" in args.only:
+            results["cut"] = bench_cut(workdir, args.clips, args.clip_length)
+        if "thumbnails" in args.only:
+            results["thumbnails"] = bench_thumbnails(workdir, args.thumbnails)
+        if "webapp" in args.only:
+            results["webapp"] = bench_webapp(workdir, args.library_size, args.events)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
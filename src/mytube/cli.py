@@ -1,23 +1,118 @@
 import argparse
+import os
+import subprocess
 import sys
 
 from .config import load_config
-from .download import YouTubeDownloader
-from .process import VideosProcessor
-from .web_app import WebApp
+from .library import RENDITIONS
 
+# Heavy dependencies (pytubefix, moviepy, cv2, gradio) are imported inside the
+# functions that need them, so each option only pays for its own imports.
+STARTUP_MODULES = ["mytube.cli", "mytube.download", "mytube.process", "mytube.web_app"]
+
+
+def download_and_pass(
+    url: str, name: str, output_dir: str = "videos", ingest: str = "link"
+):
+    """Download a YouTube video and place it in the processed folder."""
+    from .download import YouTubeDownloader
+    from .process import VideosProcessor
 
-def download_and_pass(url: str, name: str, output_dir: str = "videos"):
-    """Download a YouTube video and move it to the processed folder."""
     filename = f"{name}.mp4"
     downloader = YouTubeDownloader()
     downloader.download(url, output_dir=output_dir, filename=filename)
-    processor = VideosProcessor(videos_dir=output_dir)
+    processor = VideosProcessor(videos_dir=output_dir, ingest=ingest)
     processor.simple_pass(filename)
 
 
+def download_batch(source: str, output_dir: str = "videos", jobs: int = 4):
+    """Download all videos from a URL list file or playlist concurrently."""
+    from .download import BatchDownloader
+
+    downloader = BatchDownloader(max_workers=jobs)
+    report = downloader.download(source, output_dir=output_dir)
+    return 1 if report["failed"] else 0
+
+
+def process_videos(
+    videos_dir: str = "videos",
+    mode: str = "encode",
+    jobs: int = 1,
+    force: bool = False,
+    thumbnail_samples: int = 1,
+    renditions: tuple = (),
+    check: bool = False,
+    prune_missing: bool = False,
+):
+    """Cut all videos in a folder according to their .csv files.
+
+    Returns 1 if a source was skipped because of a missing or invalid .csv file.
+    With ``check`` the .csv files are only validated.
+    """
+    from .process import VideosProcessor
+
+    processor = VideosProcessor(
+        videos_dir=videos_dir,
+        mode=mode,
+        max_workers=jobs,
+        incremental=not force,
+        thumbnail_samples=thumbnail_samples,
+        renditions=renditions,
+        prune_missing=prune_missing,
+    )
+    skipped = processor.check() if check else processor.run()
+    return 1 if skipped else 0
+
+
+def enqueue(source: str, output_dir: str = "videos", action: str = "pass") -> int:
+    """Add all videos from a URL list file or playlist to the job queue."""
+    from .download import BatchDownloader
+    from .jobs import JobQueue
+
+    queue = JobQueue(os.path.join(output_dir, JobQueue.FILE_NAME))
+    entries = BatchDownloader.read_entries(source)
+    for url, filename in entries:
+        queue.add(url, filename, action=action)
+    print(f"Queued {len(entries)} videos")
+    return 0
+
+
+def run_worker(
+    output_dir: str = "videos", renditions: tuple = (), ingest: str = "link"
+):
+    """Work through the job queue until interrupted."""
+    from .jobs import JobWorker
+
+    JobWorker(output_dir, renditions=renditions, ingest=ingest).run_forever()
+
+
+def print_queue(output_dir: str = "videos"):
+    """Print the jobs in the queue."""
+    from .jobs import JobQueue
+
+    queue = JobQueue(os.path.join(output_dir, JobQueue.FILE_NAME))
+    for job in queue.jobs():
+        status = "running" if job["running"] else job["stage"]
+        line = f"{job['id']:>5} {job['action']:<5} {status:<9} {job['url']}"
+        if job["error"]:
+            line += f" (attempt {job['attempts']}: {job['error']})"
+        print(line)
+
+
+def segment_videos(videos_dir: str = "videos", overwrite: bool = False):
+    """Propose intervals for videos whose .csv files are missing or empty."""
+    from .segment import AutoSegmenter
+
+    segmenter = AutoSegmenter()
+    for video_file in sorted(os.listdir(videos_dir)):
+        if video_file.endswith(".mp4"):
+            segmenter.run(os.path.join(videos_dir, video_file), overwrite=overwrite)
+
+
 def launch_webapp():
     """Launch the web application with settings from config.yaml."""
+    from .web_app import WebApp
+
     config = load_config()
     paths = config.get("paths", {})
     webapp_config = config.get("webapp", {})
@@ -34,6 +129,11 @@ def launch_webapp():
         finished_path=paths.get("finished_video", "videos/info/finished.mp4"),
         color_done=webapp_config.get("color_done", "#fca903"),
         color_undone=webapp_config.get("color_undone", "#03fcdf"),
+        page_size=webapp_config.get("page_size", 48),
+        watch=webapp_config.get("watch_library", True),
+        rendition=webapp_config.get("rendition", "auto"),
+        prefetch_count=webapp_config.get("prefetch_count", 2),
+        metrics_endpoint=webapp_config.get("metrics_endpoint", False),
     )
     app.launch(
         server_name=server_config.get("host", "0.0.0.0"),
@@ -42,6 +142,50 @@ def launch_webapp():
     )
 
 
+def import_costs(module: str) -> list[tuple[str, float]]:
+    """Import a module in a fresh interpreter and return its import costs.
+
+    Returns ``(package, seconds)`` pairs for the module itself and every
+    top-level package it pulls in, sorted by cumulative import time.
+    Packages loaded during interpreter startup are not counted.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    lines = result.stderr.splitlines()
+    costs = {}
+    # Interpreter startup imports are logged before the first "mytube" line.
+    start = next((i for i, line in enumerate(lines) if "mytube" in line), 0)
+    while start > 0 and lines[start - 1].split("|")[-1].startswith("  "):
+        start -= 1
+    for line in lines[start:]:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        top = name.strip().split(".")[0]
+        if top != "mytube" or depth == 0:
+            key = name.strip() if top == "mytube" else top
+            costs[key] = max(costs.get(key, 0.0), int(cumulative) / 1e6)
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile_startup(modules: list[str] = STARTUP_MODULES, top: int = 8):
+    """Print the import cost of each CLI entry point and its heaviest packages."""
+    for module in modules:
+        costs = import_costs(module)
+        total = dict(costs).get(module, 0.0)
+        print(f"{module}: {total:.3f} s")
+        for name, seconds in costs[:top]:
+            if name != module:
+                print(f"    {name:<24} {seconds:.3f} s")
+
+
 def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="MyTube command line interface")
     parser.add_argument(
@@ -58,6 +202,93 @@ def _build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Download a video and place it in the processed folder",
     )
+    parser.add_argument(
+        "-p",
+        "--process",
+        dest="process",
+        action="store_true",
+        help="Cut the videos in the output directory according to their .csv files",
+    )
+    parser.add_argument(
+        "-s",
+        "--segment",
+        action="store_true",
+        help="Fill empty .csv files with intervals from scene and silence detection",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        metavar="SOURCE",
+        help="Download all URLs from a file (one 'url[,name]' per line) or playlist",
+    )
+    parser.add_argument(
+        "--enqueue",
+        metavar="SOURCE",
+        help="Queue all URLs from a file or playlist for --worker; "
+        "with -p/--process they are segmented and cut instead of passed whole",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Download and process queued videos until interrupted",
+    )
+    parser.add_argument(
+        "--queue-status",
+        action="store_true",
+        help="Show the queued jobs",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of parallel workers for -p/--process (1) and -b/--batch (4)",
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=["encode", "copy"],
+        default="encode",
+        help="Cutting mode used with -p/--process (copy avoids re-encoding)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-cut all clips with -p/--process, ignoring the manifest, and "
+        "overwrite existing intervals with -s/--segment",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only validate the .csv files used by -p/--process and report problems",
+    )
+    parser.add_argument(
+        "--prune-missing",
+        action="store_true",
+        help="Delete the clips of videos that were removed from the output "
+        "directory with -p/--process",
+    )
+    parser.add_argument(
+        "--thumbnail-samples",
+        type=int,
+        default=1,
+        help="Score this many frames per clip and keep the best as thumbnail",
+    )
+    parser.add_argument(
+        "--renditions",
+        nargs="*",
+        choices=sorted(RENDITIONS),
+        default=[],
+        help="Also write these lower-bitrate playback renditions with -p/--process",
+    )
+    parser.add_argument(
+        "--ingest",
+        choices=["link", "copy", "move"],
+        default="link",
+        help="How -dp/--download-pass and --worker place whole videos in the "
+        "processed folder: clone or hardlink if possible (link), independent "
+        "copy (copy) or move",
+    )
     parser.add_argument(
         "-u",
         "--url",
@@ -72,7 +303,12 @@ def _build_parser() -> argparse.ArgumentParser:
         "-o",
         "--output-dir",
         default="videos",
-        help="Directory to store downloaded videos",
+        help="Directory of the downloaded source videos",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report how long importing each part of MyTube takes and exit",
     )
     return parser
 
@@ -81,6 +317,10 @@ def main(argv: list[str] | None = None) -> int:
     parser = _build_parser()
     args = parser.parse_args(argv)
 
+    if args.profile_startup:
+        profile_startup()
+        return 0
+
     if args.webapp:
         launch_webapp()
         return 0
@@ -90,9 +330,47 @@ def main(argv: list[str] | None = None) -> int:
             parser.error(
                 "the -dp/--download-pass option requires -u/--url and -n/--name"
             )
-        download_and_pass(args.url, args.name, output_dir=args.output_dir)
+        download_and_pass(
+            args.url, args.name, output_dir=args.output_dir, ingest=args.ingest
+        )
         return 0
 
+    if args.enqueue:
+        action = "cut" if args.process else "pass"
+        return enqueue(args.enqueue, output_dir=args.output_dir, action=action)
+
+    if args.queue_status:
+        print_queue(args.output_dir)
+        return 0
+
+    if args.worker:
+        run_worker(
+            args.output_dir, renditions=tuple(args.renditions), ingest=args.ingest
+        )
+        return 0
+
+    if args.batch:
+        return download_batch(
+            args.batch, output_dir=args.output_dir, jobs=args.jobs or 4
+        )
+
+    if args.segment:
+        segment_videos(args.output_dir, overwrite=args.force)
+        if not args.process:
+            return 0
+
+    if args.process or args.check:
+        return process_videos(
+            args.output_dir,
+            mode=args.mode,
+            jobs=args.jobs or 1,
+            force=args.force,
+            thumbnail_samples=args.thumbnail_samples,
+            renditions=tuple(args.renditions),
+            check=args.check,
+            prune_missing=args.prune_missing,
+        )
+
     parser.print_help()
     return 0
 
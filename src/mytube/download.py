@@ -1,14 +1,117 @@
 # %%
 
+import json
 import os
-from pytubefix import YouTube
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from pytubefix import Playlist, YouTube
 from pytubefix.cli import on_progress
-import pandas as pd
+from pytubefix.exceptions import (
+    AgeCheckRequiredAccountError,
+    AgeCheckRequiredError,
+    AgeRestrictedError,
+    BotDetection,
+    InnerTubeResponseError,
+    LoginRequired,
+    PoTokenRequired,
+    RegexMatchError,
+    UnknownVideoError,
+    VideoUnavailable,
+)
 
-import logging
+from .intervals import write_intervals
+from .logger import get_logger
+from .metrics import metrics
 
 # %%
 
+# Errors that depend on the client used to request the video
+CLIENT_ERRORS = (
+    AgeCheckRequiredAccountError,
+    AgeCheckRequiredError,
+    AgeRestrictedError,
+    BotDetection,
+    InnerTubeResponseError,
+    LoginRequired,
+    PoTokenRequired,
+    UnknownVideoError,
+)
+# Errors that no other client can get around, such as a private video
+URL_ERRORS = (RegexMatchError, VideoUnavailable)
+
+
+def is_client_error(error: Exception) -> bool:
+    """Whether a download error is specific to the client that was used."""
+    if isinstance(error, HTTPError):
+        return error.code == 403
+    return isinstance(error, CLIENT_ERRORS)
+
+
+class ClientScoreboard:
+    """Success/failure statistics of download clients, persisted as JSON.
+
+    The client that succeeded most recently is tried first, the others follow
+    by their smoothed success rate. A client that failed recently is put at
+    the end of the order until ``failure_ttl`` seconds have passed.
+    """
+
+    def __init__(
+        self, path: str | None = "ytd_clients.json", failure_ttl: float = 600
+    ):
+        self.path = os.path.abspath(path) if path else None
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self.scores = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.scores, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def order(self, clients: list[str]) -> list[str]:
+        t_now = time.time()
+
+        def key(item):
+            idx, client = item
+            score = self.scores.get(client, {})
+            blocked = t_now - score.get("last_failure", 0) < self.failure_ttl
+            rate = (score.get("successes", 0) + 1) / (score.get("attempts", 0) + 2)
+            return (blocked, -score.get("last_success", 0), -rate, idx)
+
+        with self._lock:
+            return [client for _, client in sorted(enumerate(clients), key=key)]
+
+    def record(self, client: str, success: bool):
+        with self._lock:
+            score = self.scores.setdefault(client, {"attempts": 0, "successes": 0})
+            score["attempts"] += 1
+            if success:
+                score["successes"] += 1
+                score["last_success"] = time.time()
+                score.pop("last_failure", None)
+            else:
+                score["last_failure"] = time.time()
+            self._save()
+
 
 class YouTubeDownloader:
     CLIENTS = [
@@ -31,49 +134,285 @@ class YouTubeDownloader:
         "WEB_SAFARI",
     ]
 
-    def __init__(self, log: bool = False):
+    CHUNK_SIZE = 9 * 1024 * 1024
+    TIMEOUT = 30
+
+    def __init__(
+        self,
+        log: bool = False,
+        progress: bool = True,
+        scoreboard_path: str | None = "ytd_clients.json",
+    ):
         self.log = log
-        self.logger = logging.getLogger(name="ytd")
-        self.logger.setLevel(level=logging.INFO)
-        self.logger.addHandler(logging.StreamHandler())
-        formatter = logging.Formatter("%(name)s:%(levelname)s: %(message)s")
-        for handler in self.logger.handlers:
-            handler.setFormatter(formatter)
+        self.progress = progress
+        self.scoreboard = ClientScoreboard(scoreboard_path)
+        self.logger = get_logger("ytd")
 
     def download(self, url: str, output_dir: str = "videos", filename: str = None):
-        """Download video with one of the clients from the CLIENTS list."""
-        for i, client in enumerate(self.CLIENTS):
+        """Download video with one of the clients from the CLIENTS list.
+
+        Clients are tried in the order given by the scoreboard, so the client
+        that succeeded last time is tried first. Only errors that depend on the
+        client, such as bot detection, a required login or HTTP 403, count
+        against it on the scoreboard. Errors of the video itself, such as an
+        invalid URL or a private video, stop the download right away.
+
+        Returns the path of the downloaded file, or None if all clients failed.
+        """
+        for i, client in enumerate(self.scoreboard.order(self.CLIENTS)):
             try:
                 # Try to reach filetype and create YouTube object
                 if self.log:
                     self.logger.info(f"Client {client}: {i+1} of {len(self.CLIENTS)}")
                     self.logger.info(f"Client {client}: Trying")
-                yt = YouTube(url=url, client=client, on_progress_callback=on_progress)
+                yt = YouTube(
+                    url=url,
+                    client=client,
+                    on_progress_callback=on_progress if self.progress else None,
+                )
                 ys = yt.streams.get_highest_resolution()
                 # Download filetype (video or audio)
                 if output_dir:
                     os.makedirs(output_dir, exist_ok=True)
-                ys.download(
-                    output_path=output_dir if output_dir else os.getcwd(),
-                    filename=filename,
-                )
+                with metrics.timer("download"):
+                    path = self.download_stream(
+                        ys,
+                        output_dir=output_dir if output_dir else os.getcwd(),
+                        filename=filename,
+                    )
+                self.scoreboard.record(client, success=True)
+                metrics.count("downloads_succeeded")
                 if self.log:
                     self.logger.info(f"Client {client}: Success downloading.")
-                df = pd.DataFrame(
-                    columns=["Start_min", "Start_sec", "End_min", "End_sec", "Name"]
-                )
                 if filename:
                     csv_name = filename.replace(".mp4", ".csv")
                 else:
                     csv_name = yt.title.replace(".mp4", ".csv")
-                df.to_csv(f"{output_dir}/{csv_name}", index=False)
+                write_intervals(f"{output_dir}/{csv_name}", [])
                 if self.log:
                     self.logger.info(f"Created .csv file")
                 # Return from function if success
-                return
+                return path
             except Exception as e:
+                if is_client_error(e):
+                    self.scoreboard.record(client, success=False)
+                    metrics.count("download_client_failures")
+                elif isinstance(e, URL_ERRORS):
+                    self.logger.warning(f"Cannot download {url}: {e}")
+                    break
                 if self.log:
                     self.logger.info(f"Client {client}: Error occurred: {e}\n")
+        self.logger.warning(f"Failed to download {url}")
+        metrics.count("downloads_failed")
+        return None
+
+    @staticmethod
+    def _resume_offset(part_path: str, state_path: str, filesize: int) -> int:
+        """Return the last verified offset of a partial download, or 0."""
+        if not os.path.exists(part_path):
+            return 0
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return 0
+        if state.get("filesize") != filesize:
+            return 0
+        return min(int(state.get("offset", 0)), os.path.getsize(part_path))
+
+    @staticmethod
+    def _write_resume_state(state_path: str, filesize: int | None, offset: int):
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"filesize": filesize, "offset": offset}, f)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _verify_duration(part_path: str, ys):
+        """Check that a download without known size is a complete video."""
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+        try:
+            duration = ffmpeg_parse_infos(part_path)["duration"]
+        except Exception as e:
+            raise OSError(f"{part_path} is not a readable video") from e
+        expected = int(getattr(ys, "durationMs", 0) or 0) / 1000
+        if not expected or abs(duration - expected) > max(1.0, 0.01 * expected):
+            raise OSError(
+                f"Duration mismatch for {part_path}: got {duration:.1f}s, "
+                f"expected {expected:.1f}s"
+            )
+
+    def _fetch_range(self, url: str, start: int, stop: int) -> bytes:
+        request = urllib.request.Request(
+            f"{url}&range={start}-{stop}",
+            headers={"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"},
+        )
+        with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+            return response.read()
+
+    def download_stream(self, ys, output_dir: str, filename: str = None) -> str:
+        """Download a stream in ranged chunks and move it in place when complete.
+
+        Data is written to ``<path>.part`` and the offset of every fsynced chunk
+        is recorded in ``<path>.part.json``. An interrupted download resumes from
+        that offset. The file is renamed to its final name only once its size
+        matches the size announced by the stream, so partial files never end
+        up as ``.mp4`` in the videos folder. If the stream announces no size,
+        chunks are fetched until a short one arrives and the file is only
+        renamed if its duration matches the duration of the stream.
+        """
+        path = os.path.join(output_dir, filename or ys.default_filename)
+        part_path = f"{path}.part"
+        state_path = f"{part_path}.json"
+        filesize = ys.filesize or None
+        offset = self._resume_offset(part_path, state_path, filesize)
+        if offset and self.log:
+            self.logger.info(f"Resuming {path} at {offset} of {filesize} bytes")
+        with open(part_path, "r+b" if offset else "wb") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            while filesize is None or offset < filesize:
+                stop = offset + self.CHUNK_SIZE
+                if filesize is not None:
+                    stop = min(stop, filesize)
+                chunk = self._fetch_range(ys.url, offset, stop - 1)
+                last = len(chunk) < stop - offset
+                if last and filesize is not None:
+                    raise OSError(
+                        f"Short read at offset {offset}: got {len(chunk)} bytes"
+                    )
+                f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+                offset += len(chunk)
+                self._write_resume_state(state_path, filesize, offset)
+                if self.progress and filesize is not None:
+                    on_progress(ys, chunk, filesize - offset)
+                if last:
+                    break
+        if filesize is None:
+            try:
+                self._verify_duration(part_path, ys)
+            except OSError:
+                # Nothing to resume from, start over on the next attempt
+                os.remove(part_path)
+                os.remove(state_path)
+                raise
+        elif os.path.getsize(part_path) != filesize:
+            raise OSError(f"Size mismatch for {part_path}, expected {filesize} bytes")
+        os.replace(part_path, path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return path
+
+
+# %%
+
+
+class HostRateLimiter:
+    """Enforce a minimum interval between requests to the same host."""
+
+    def __init__(self, min_interval: float = 1.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            t_now = time.monotonic()
+            slot = max(t_now, self._next_slot.get(host, t_now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BatchDownloader:
+    """Download many videos concurrently with a bounded pool of workers.
+
+    Sources can be a list of URLs, a text file with one URL per line (optionally
+    followed by ``,name``) or a playlist URL.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        min_interval: float = 1.0,
+        log: bool = False,
+    ):
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(min_interval)
+        self.downloader = YouTubeDownloader(log=log, progress=False)
+        self.logger = self.downloader.logger
+
+    @staticmethod
+    def read_entries(source: str | list[str]) -> list[tuple[str, str | None]]:
+        """Return ``(url, filename)`` pairs from a list, file or playlist."""
+        if isinstance(source, str):
+            if os.path.isfile(source):
+                with open(source, "r", encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            else:
+                lines = [source]
+        else:
+            lines = list(source)
+        entries = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            url, _, name = (part.strip() for part in line.partition(","))
+            if "list=" in url and "watch?v=" not in url:
+                entries.extend(
+                    (video_url, None) for video_url in Playlist(url).video_urls
+                )
+            else:
+                entries.append((url, f"{name}.mp4" if name else None))
+        return entries
+
+    def _download(self, url: str, output_dir: str, filename: str | None):
+        self.rate_limiter.wait(url)
+        return self.downloader.download(url, output_dir=output_dir, filename=filename)
+
+    def download(self, source: str | list[str], output_dir: str = "videos"):
+        """Download all entries of ``source`` and report successes and failures.
+
+        Returns a dictionary with the lists of ``succeeded`` paths and ``failed``
+        URLs.
+        """
+        entries = self.read_entries(source)
+        n_total = len(entries)
+        succeeded = []
+        failed = []
+        self.logger.info(
+            f"Downloading {n_total} videos with {self.max_workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._download, url, output_dir, filename): url
+                for url, filename in entries
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Failed to download {url}: {e}")
+                    path = None
+                if path:
+                    succeeded.append(path)
                 else:
-                    continue
-        self.logger.warning(f"Failed to download {yt.title}")
+                    failed.append(url)
+                n_done = len(succeeded) + len(failed)
+                self.logger.info(
+                    f"Progress: {n_done}/{n_total} "
+                    f"({len(succeeded)} succeeded, {len(failed)} failed)"
+                )
+        self.logger.info(
+            f"Batch finished: {len(succeeded)} of {n_total} videos downloaded"
+        )
+        for url in failed:
+            self.logger.warning(f"Failed: {url}")
+        return {"succeeded": succeeded, "failed": failed}
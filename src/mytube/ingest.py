@@ -0,0 +1,85 @@
+# %%
+
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# %%
+
+MODES = ("link", "copy", "move")
+# ioctl request that clones the extents of one file into another (Linux)
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def reflink(src: str, dst: str):
+    """Create ``dst`` as a copy-on-write clone of ``src`` (btrfs, XFS)."""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def stream_copy(src: str, dst: str):
+    """Copy ``src`` to ``dst`` in the kernel with sendfile, else in chunks."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            # No sendfile for these files, continue where it stopped
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+
+def ingest_file(src: str, dst: str, mode: str = "link") -> str:
+    """Place ``src`` at ``dst`` with as little copying as possible.
+
+    ``link`` clones the file (reflink) or hardlinks it when both paths are on
+    the same filesystem and only copies otherwise. ``copy`` always creates an
+    independent file, but still clones it where supported. ``move`` renames
+    the file and falls back to copying and deleting it across filesystems.
+    The file appears at ``dst`` atomically. Returns the method that was used.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown ingest mode {mode!r}, expected one of {MODES}")
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"Video file {src} not found")
+    if mode == "move":
+        try:
+            os.replace(src, dst)
+            return "rename"
+        except OSError:
+            pass
+    tmp_path = f"{dst}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    attempts = [("reflink", reflink)]
+    if mode == "link":
+        attempts.append(("hardlink", os.link))
+    for method, fn in attempts:
+        try:
+            fn(src, tmp_path)
+            break
+        except (AttributeError, OSError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    else:
+        method = "copy"
+        stream_copy(src, tmp_path)
+        shutil.copystat(src, tmp_path)
+    os.replace(tmp_path, dst)
+    if mode == "move":
+        os.remove(src)
+    return method
@@ -0,0 +1,219 @@
+# %%
+
+import csv
+import math
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import NamedTuple
+
+from .library import RENDITIONS
+
+CSV_HEADER = ["Start", "End", "Name"]
+LEGACY_HEADER = ["Start_min", "Start_sec", "End_min", "End_sec", "Name"]
+MODES = ("encode", "copy")
+# Clips may end this many seconds after the probed source duration
+DURATION_TOLERANCE = 0.1
+
+# %%
+
+
+class IntervalError(ValueError):
+    """An interval CSV that cannot be used, with all problems found in it."""
+
+    def __init__(self, csv_path: str, problems: list[str]):
+        self.csv_path = csv_path
+        self.problems = problems
+        super().__init__(f"{csv_path}: " + "; ".join(problems))
+
+
+class Interval(NamedTuple):
+    """A clip of a source, with times in seconds and optional per-clip options.
+
+    ``options`` may hold ``mode`` (``"encode"`` or ``"copy"``), ``thumbnail``
+    (seconds into the clip) and ``renditions`` (tuple of rendition names).
+    """
+
+    start: float
+    end: float
+    name: str
+    options: Mapping = MappingProxyType({})
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def parse_timestamp(text: str) -> float:
+    """Parse ``hh:mm:ss.mmm``, ``mm:ss.mmm``, ``ss.mmm`` or ``<n>ms`` to seconds."""
+    text = text.strip()
+    try:
+        if text.endswith("ms"):
+            seconds = float(text[:-2]) / 1000
+        else:
+            parts = text.split(":")
+            if len(parts) > 3:
+                raise ValueError
+            seconds = 0.0
+            for idx, part in enumerate(parts):
+                value = float(part)
+                if idx and not 0 <= value < 60:
+                    raise ValueError
+                seconds = seconds * 60 + value
+        if not math.isfinite(seconds) or seconds < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"invalid timestamp {text!r}") from None
+    return seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as ``hh:mm:ss.mmm``."""
+    milliseconds = round(seconds * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds / 1000:06.3f}"
+
+
+def _legacy_seconds(row: dict, prefix: str) -> float:
+    minutes, seconds = row[f"{prefix}_min"], row[f"{prefix}_sec"]
+    try:
+        return 60 * int(minutes) + float(seconds)
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"invalid {prefix.lower()} {minutes!r} min {seconds!r} sec"
+        ) from None
+
+
+def _parse_options(row: dict) -> dict:
+    options = {}
+    mode = (row.get("Mode") or "").strip()
+    if mode:
+        if mode not in MODES:
+            raise ValueError(f"unknown mode {mode!r}, expected one of {MODES}")
+        options["mode"] = mode
+    thumbnail = (row.get("Thumbnail") or "").strip()
+    if thumbnail:
+        options["thumbnail"] = parse_timestamp(thumbnail)
+    renditions = (row.get("Renditions") or "").split()
+    if renditions:
+        unknown = [name for name in renditions if name not in RENDITIONS]
+        if unknown:
+            raise ValueError(f"unknown renditions {unknown}")
+        options["renditions"] = tuple(renditions)
+    return options
+
+
+def read_intervals(csv_path: str) -> list[Interval]:
+    """Read the intervals of a CSV file.
+
+    Times are given either as ``Start`` and ``End`` timestamps (see
+    :func:`parse_timestamp`) or in the legacy ``Start_min``, ``Start_sec``,
+    ``End_min`` and ``End_sec`` columns, where seconds may have decimals.
+    Optional ``Mode``, ``Thumbnail`` and ``Renditions`` columns set per-clip
+    options. Raises :class:`IntervalError` listing every malformed row, or if
+    the file is not valid text or CSV.
+    """
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        try:
+            columns = set(reader.fieldnames or [])
+            if {"Start", "End", "Name"} <= columns:
+                legacy = False
+            elif set(LEGACY_HEADER) <= columns:
+                legacy = True
+            else:
+                raise IntervalError(
+                    csv_path,
+                    [f"expected columns {CSV_HEADER} or {LEGACY_HEADER}"],
+                )
+            intervals = []
+            problems = []
+            for row in reader:
+                line = reader.line_num
+                try:
+                    if legacy:
+                        start = _legacy_seconds(row, "Start")
+                        end = _legacy_seconds(row, "End")
+                    else:
+                        start = parse_timestamp(row["Start"] or "")
+                        end = parse_timestamp(row["End"] or "")
+                    name = (row["Name"] or "").strip()
+                    intervals.append(Interval(start, end, name, _parse_options(row)))
+                except (TypeError, ValueError) as e:
+                    problems.append(f"line {line}: {e}")
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise IntervalError(csv_path, [f"not a readable CSV file ({e})"]) from None
+    if problems:
+        raise IntervalError(csv_path, problems)
+    return intervals
+
+
+def validate_intervals(
+    intervals: list[Interval], duration: float | None = None
+) -> tuple[list[str], list[str]]:
+    """Check intervals against each other and the source duration.
+
+    Returns ``(errors, warnings)``. Empty or reversed ranges, ranges past the
+    end of the source, missing or duplicate names and thumbnails outside
+    their clip are errors. Overlapping clips are allowed but reported as
+    warnings.
+    """
+    errors = []
+    warnings = []
+    names = set()
+    for interval in intervals:
+        label = f"clip {interval.name!r}"
+        if not interval.name or "/" in interval.name or "\\" in interval.name:
+            errors.append(f"{label}: name must be non-empty without slashes")
+        elif interval.name in names:
+            errors.append(f"{label}: duplicate name")
+        names.add(interval.name)
+        if not 0 <= interval.start < math.inf:
+            errors.append(f"{label}: invalid start {interval.start}")
+        elif interval.end <= interval.start:
+            errors.append(
+                f"{label}: end {format_timestamp(interval.end)} is not after "
+                f"start {format_timestamp(interval.start)}"
+            )
+        if duration is not None and interval.end > duration + DURATION_TOLERANCE:
+            errors.append(
+                f"{label}: end {format_timestamp(interval.end)} is past the end "
+                f"of the source ({format_timestamp(duration)})"
+            )
+        if interval.options.get("thumbnail", 0) > interval.duration:
+            errors.append(f"{label}: thumbnail time lies outside the clip")
+    latest = None
+    for interval in sorted(intervals, key=lambda interval: interval.start):
+        if latest is not None and interval.start < latest.end:
+            warnings.append(f"clips {latest.name!r} and {interval.name!r} overlap")
+        if latest is None or interval.end > latest.end:
+            latest = interval
+    return errors, warnings
+
+
+def load_intervals(
+    csv_path: str, duration: float | None = None
+) -> tuple[list[Interval], list[str]]:
+    """Read and validate the intervals of a CSV file.
+
+    Returns the intervals and the validation warnings. Raises
+    :class:`IntervalError` if the file is malformed or fails validation.
+    """
+    intervals = read_intervals(csv_path)
+    errors, warnings = validate_intervals(intervals, duration)
+    if errors:
+        raise IntervalError(csv_path, errors)
+    return intervals, warnings
+
+
+def write_intervals(csv_path: str, intervals: list[tuple[float, float, str]]):
+    """Write ``(start, end, name)`` intervals in seconds as an interval CSV.
+
+    An empty list writes only the header, which is the template filled in by
+    hand.
+    """
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for start, end, name in intervals:
+            writer.writerow([format_timestamp(start), format_timestamp(end), name])
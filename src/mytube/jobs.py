@@ -0,0 +1,316 @@
+# %%
+
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+
+from .logger import get_logger
+from .metrics import metrics
+
+# %%
+
+ACTIONS = ("pass", "cut")
+# Stages a job moves through, in order
+STAGES = ("download", "cut", "done")
+
+
+class JobQueue:
+    """Persistent queue of download jobs, stored in SQLite.
+
+    A job is a URL with an ``action``: ``"pass"`` adds the whole video to the
+    library like ``mytube -dp``, ``"cut"`` fills its .csv by scene and silence
+    detection and cuts it like ``mytube -s -p``. Jobs move through the
+    ``STAGES`` and are claimed per stage, so separate workers can run the
+    stages side by side. A failed stage is retried after an exponential
+    backoff until ``max_attempts`` is reached. Running jobs are marked with
+    the host and pid of their worker, which refreshes them with
+    :meth:`heartbeat`. Jobs of a worker that died are picked up again by
+    :meth:`recover`.
+    """
+
+    FILE_NAME = "jobs.sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 5,
+        backoff: float = 30,
+        max_backoff: float = 3600,
+        stale_after: float = 300,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, url TEXT NOT NULL, filename TEXT, "
+            "action TEXT NOT NULL, stage TEXT NOT NULL, "
+            "running INTEGER NOT NULL DEFAULT 0, owner TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt REAL NOT NULL DEFAULT 0, path TEXT, error TEXT, "
+            "updated REAL NOT NULL)"
+        )
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def add(self, url: str, filename: str | None = None, action: str = "pass"):
+        """Queue a URL and return the id of the new job."""
+        if action not in ACTIONS:
+            raise ValueError(
+                f"Unknown job action {action!r}, expected one of {ACTIONS}"
+            )
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (url, filename, action, stage, updated) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (url, filename, action, STAGES[0], time.time()),
+        )
+        return cursor.lastrowid
+
+    def claim(self, stage: str) -> dict | None:
+        """Mark the oldest due job of a stage as running and return it."""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE stage = ? AND running = 0 "
+                "AND next_attempt <= ? ORDER BY next_attempt, id LIMIT 1",
+                (stage, time.time()),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET running = 1, owner = ?, updated = ? "
+                    "WHERE id = ?",
+                    (self.owner, time.time(), row["id"]),
+                )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return None if row is None else dict(row)
+
+    def advance(self, job_id: int, path: str | None = None):
+        """Move a job to its next stage and reset its attempts."""
+        connection = self._connect()
+        stage = connection.execute(
+            "SELECT stage FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()["stage"]
+        connection.execute(
+            "UPDATE jobs SET stage = ?, running = 0, owner = NULL, attempts = 0, "
+            "next_attempt = 0, error = NULL, path = COALESCE(?, path), "
+            "updated = ? WHERE id = ?",
+            (STAGES[STAGES.index(stage) + 1], path, time.time(), job_id),
+        )
+
+    def fail(self, job_id: int, error: str) -> bool:
+        """Record a failed attempt and schedule a retry.
+
+        Returns False if the job ran out of attempts and is given up.
+        """
+        connection = self._connect()
+        attempts = connection.execute(
+            "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()["attempts"]
+        attempts += 1
+        retry = attempts < self.max_attempts
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        connection.execute(
+            "UPDATE jobs SET running = 0, owner = NULL, attempts = ?, "
+            "next_attempt = ?, "
+            "error = ?, stage = CASE WHEN ? THEN stage ELSE 'failed' END, "
+            "updated = ? WHERE id = ?",
+            (attempts, time.time() + delay, error, retry, time.time(), job_id),
+        )
+        return retry
+
+    def heartbeat(self):
+        """Mark the running jobs of this process as alive."""
+        self._connect().execute(
+            "UPDATE jobs SET updated = ? WHERE running = 1 AND owner = ?",
+            (time.time(), self.owner),
+        )
+
+    @staticmethod
+    def _owner_alive(owner: str | None) -> bool | None:
+        """Whether the worker process of a job exists, None if unknown."""
+        host, _, pid = (owner or "").rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+            return None
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def recover(self) -> int:
+        """Release jobs of stopped workers and return their number.
+
+        A running job is released when its worker ran on this host and its
+        process is gone, or when it has not had a heartbeat for
+        ``stale_after`` seconds. Jobs of live workers are left alone.
+        """
+        connection = self._connect()
+        cutoff = time.time() - self.stale_after
+        rows = connection.execute(
+            "SELECT id, owner, updated FROM jobs WHERE running = 1"
+        ).fetchall()
+        n_released = 0
+        for row in rows:
+            alive = self._owner_alive(row["owner"])
+            if row["updated"] >= cutoff and alive is not False:
+                continue
+            cursor = connection.execute(
+                "UPDATE jobs SET running = 0, owner = NULL "
+                "WHERE id = ? AND running = 1 AND updated = ?",
+                (row["id"], row["updated"]),
+            )
+            n_released += cursor.rowcount
+        return n_released
+
+    def jobs(self) -> list[dict]:
+        """Return all jobs, oldest first."""
+        rows = self._connect().execute("SELECT * FROM jobs ORDER BY id")
+        return [dict(row) for row in rows]
+
+
+class JobWorker:
+    """Work through a :class:`JobQueue` until stopped.
+
+    Every stage runs on its own thread, so the next video is downloaded while
+    the previous one is being cut. Stages poll the queue every
+    ``poll_interval`` seconds when there is nothing to do. Another thread
+    sends heartbeats for the running jobs and releases jobs of dead workers.
+    """
+
+    def __init__(
+        self,
+        videos_dir: str = "videos",
+        queue: JobQueue | None = None,
+        poll_interval: float = 5,
+        renditions: tuple = (),
+        ingest: str = "link",
+    ):
+        self.videos_dir = videos_dir
+        self.queue = queue or JobQueue(os.path.join(videos_dir, JobQueue.FILE_NAME))
+        self.poll_interval = poll_interval
+        self.renditions = tuple(renditions)
+        self.ingest = ingest
+        self.logger = get_logger("jobs")
+        self._stop = threading.Event()
+        self._threads = []
+        self._downloader = None
+
+    def download(self, job: dict) -> str:
+        """Download the video of a job and return its path."""
+        from .download import YouTubeDownloader
+
+        if self._downloader is None:
+            self._downloader = YouTubeDownloader(progress=False)
+        path = self._downloader.download(
+            job["url"], output_dir=self.videos_dir, filename=job["filename"]
+        )
+        if path is None:
+            raise RuntimeError(f"All clients failed to download {job['url']}")
+        return path
+
+    def cut(self, job: dict):
+        """Add the downloaded video of a job to the library."""
+        from .process import VideosProcessor
+        from .segment import AutoSegmenter
+
+        processor = VideosProcessor(
+            self.videos_dir, renditions=self.renditions, ingest=self.ingest
+        )
+        name = os.path.basename(job["path"])
+        if job["action"] == "pass":
+            processor.simple_pass(name)
+            return
+        AutoSegmenter().run(job["path"])
+        for reason in processor.run(sources=[name]).values():
+            raise RuntimeError(reason)
+
+    def _run_stage(self, stage: str, fn):
+        while not self._stop.is_set():
+            job = self.queue.claim(stage)
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.logger.info(f"Job {job['id']}: {stage} {job['url']}")
+            try:
+                with metrics.timer(f"job_{stage}"):
+                    path = fn(job)
+            except Exception as e:
+                metrics.count("job_failures")
+                retry = self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+                self.logger.warning(
+                    f"Job {job['id']}: {stage} failed ({e}), "
+                    + ("will retry" if retry else "giving up")
+                )
+                continue
+            self.queue.advance(job["id"], path)
+            self.logger.info(f"Job {job['id']}: {stage} done")
+
+    def _heartbeat(self):
+        interval = self.queue.stale_after / 5
+        while True:
+            n_recovered = self.queue.recover()
+            if n_recovered:
+                self.logger.info(f"Resuming {n_recovered} interrupted jobs")
+            if self._stop.wait(interval):
+                break
+            self.queue.heartbeat()
+
+    def start(self):
+        """Start one thread per stage and one for heartbeats."""
+        self._stop.clear()
+        targets = [
+            ("heartbeat", self._heartbeat, ()),
+            ("download", self._run_stage, ("download", self.download)),
+            ("cut", self._run_stage, ("cut", self.cut)),
+        ]
+        for name, target, args in targets:
+            thread = threading.Thread(target=target, args=args, name=f"jobs-{name}")
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop after the jobs that are currently running."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run_forever(self):
+        """Run until interrupted with Ctrl+C or SIGTERM."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.logger.info("Stopping after the running jobs")
+        finally:
+            self.stop()
@@ -0,0 +1,193 @@
+# %%
+
+import glob
+import os
+import sqlite3
+
+# %%
+
+THUMBNAIL_EXTENSIONS = (".jpg", ".webp", ".png")
+# Playback renditions: name -> (maximum height, video bitrate in kbit/s)
+RENDITIONS = {"480p": (480, 1200), "360p": (360, 700)}
+
+
+def rendition_path(clip_path: str, name: str) -> str:
+    """Return the path of a rendition of a clip in the renditions subfolder."""
+    base_name = os.path.splitext(os.path.basename(clip_path))[0]
+    return os.path.join(
+        os.path.dirname(clip_path), "renditions", f"{base_name}_{name}.mp4"
+    )
+
+
+def remove_renditions(clip_path: str, keep: tuple = ()) -> list[str]:
+    """Delete the renditions of a clip except ``keep`` and return their names."""
+    removed = []
+    for name in RENDITIONS:
+        path = rendition_path(clip_path, name)
+        if name not in keep and os.path.exists(path):
+            os.remove(path)
+            removed.append(name)
+    return removed
+
+
+def find_thumbnail(thumbnail_folder: str, video_path: str) -> str | None:
+    """Return the existing thumbnail of a video, trying all known extensions."""
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    for extension in THUMBNAIL_EXTENSIONS:
+        thumbnail_path = os.path.join(thumbnail_folder, base_name + extension)
+        if os.path.exists(thumbnail_path):
+            return thumbnail_path
+    return None
+
+
+class LibraryIndex:
+    """SQLite index of the clips in a processed videos folder.
+
+    Each row holds the clip name, its thumbnail path relative to the folder,
+    duration, size and modification time. The processor keeps the index up to
+    date as it writes clips, so the web app can load the library with a single
+    query instead of scanning the folder.
+    """
+
+    FILE_NAME = "library.sqlite"
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, self.FILE_NAME)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        """Open the index, creating and seeding it from the folder if needed.
+
+        Seeding makes sure that clips processed before the index existed are
+        not hidden when the first writer creates it.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            created = not connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clips'"
+            ).fetchone()
+            if created:
+                connection.execute(
+                    "CREATE TABLE clips ("
+                    "name TEXT PRIMARY KEY, thumbnail TEXT NOT NULL, "
+                    "duration REAL, size INTEGER, mtime REAL)"
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                    self._scan(),
+                )
+        return connection
+
+    def _scan(self) -> list[tuple]:
+        """Return index rows for all clips in the folder that have a thumbnail."""
+        thumbnail_folder = os.path.join(self.folder, "thumbnails")
+        rows = []
+        for video_path in sorted(glob.glob(os.path.join(self.folder, "*.mp4"))):
+            thumbnail_path = find_thumbnail(thumbnail_folder, video_path)
+            if thumbnail_path is not None:
+                rows.append(self._row(video_path, thumbnail_path, None))
+        return rows
+
+    def _row(self, clip_path: str, thumbnail_path: str, duration: float | None):
+        stat = os.stat(clip_path)
+        return (
+            os.path.basename(clip_path),
+            os.path.relpath(thumbnail_path, self.folder),
+            duration,
+            stat.st_size,
+            stat.st_mtime,
+        )
+
+    def add(self, clip_path: str, thumbnail_path: str, duration: float = None):
+        """Insert or update a clip. Clips without thumbnail are skipped."""
+        if not (os.path.exists(clip_path) and os.path.exists(thumbnail_path)):
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                self._row(clip_path, thumbnail_path, duration),
+            )
+        connection.close()
+
+    def remove(self, clip_path: str):
+        with self._connect() as connection:
+            connection.execute(
+                "DELETE FROM clips WHERE name = ?", (os.path.basename(clip_path),)
+            )
+        connection.close()
+
+    def entries(self) -> list[dict]:
+        """Return all clips ordered by name with paths joined to the folder."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT name, thumbnail, duration, size, mtime FROM clips "
+                "ORDER BY name"
+            ).fetchall()
+        connection.close()
+        return [
+            {
+                "video": os.path.join(self.folder, name),
+                "thumbnail": os.path.join(self.folder, thumbnail),
+                "duration": duration,
+                "size": size,
+                "mtime": mtime,
+            }
+            for name, thumbnail, duration, size, mtime in rows
+        ]
+
+    def sync(self) -> set[str]:
+        """Reconcile the index with the folder.
+
+        Clips that are missing from the index or whose size or modification time
+        changed are (re-)indexed with their known duration, and rows of deleted
+        clips are removed. Only file metadata is read. Returns the base names of
+        the clips that changed.
+        """
+        changed = set()
+        thumbnail_folder = os.path.join(self.folder, "thumbnails")
+        with self._connect() as connection:
+            indexed = {
+                name: (thumbnail, duration, size, mtime)
+                for name, thumbnail, duration, size, mtime in connection.execute(
+                    "SELECT name, thumbnail, duration, size, mtime FROM clips"
+                )
+            }
+            on_disk = set()
+            for video_path in glob.glob(os.path.join(self.folder, "*.mp4")):
+                name = os.path.basename(video_path)
+                thumbnail_path = find_thumbnail(thumbnail_folder, video_path)
+                if thumbnail_path is None:
+                    continue
+                on_disk.add(name)
+                row = self._row(video_path, thumbnail_path, None)
+                known = indexed.get(name)
+                if known is not None and known[0] == row[1] and known[2:] == row[3:]:
+                    continue
+                duration = known[1] if known and known[2:] == row[3:] else None
+                changed.add(name)
+                connection.execute(
+                    "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                    (*row[:2], duration, *row[3:]),
+                )
+            removed = indexed.keys() - on_disk
+            connection.executemany(
+                "DELETE FROM clips WHERE name = ?", [(name,) for name in removed]
+            )
+            changed |= removed
+        connection.close()
+        return {os.path.splitext(name)[0] for name in changed}
+
+    def rebuild(self):
+        """Replace the index content with a scan of the folder."""
+        rows = self._scan()
+        with self._connect() as connection:
+            connection.execute("DELETE FROM clips")
+            connection.executemany(
+                "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)", rows
+            )
+        connection.close()
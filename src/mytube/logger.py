@@ -6,10 +6,15 @@ import logging
 
 
 def get_logger(name: str) -> logging.Logger:
+    """Return a logger with a single stream handler.
+
+    Calling this again for the same name reuses the existing handler instead of
+    adding another one, so log lines are not duplicated.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
-    logger.addHandler(logging.StreamHandler())
-    formatter = logging.Formatter("%(name)s:%(levelname)s: %(message)s")
-    for handler in logger.handlers:
-        handler.setFormatter(formatter)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s:%(levelname)s: %(message)s"))
+        logger.addHandler(handler)
     return logger
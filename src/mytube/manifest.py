@@ -0,0 +1,153 @@
+# %%
+
+import hashlib
+import json
+import os
+
+from .library import rendition_path
+
+# %%
+
+
+class Manifest:
+    """Persistent record of processed clips for incremental processing.
+
+    Each output clip is stored with the hash of its source video and the hash of
+    its CSV row combined with the encoder settings. A clip is up to date when
+    both hashes still match and the clip and its thumbnail exist. Renditions
+    are recorded per clip with the version of the clip they were made from, so
+    they can be added or dropped without cutting the clip again.
+
+    Source hashes are cached by size and modification time, so unchanged
+    sources are not read again on reruns.
+    """
+
+    FILE_NAME = "manifest.json"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        data.setdefault("sources", {})
+        data.setdefault("outputs", {})
+        return data
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def file_hash(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def source_hash(self, video_path: str) -> str:
+        """Return the content hash of a source, reusing the cached value."""
+        stat = os.stat(video_path)
+        key = os.path.basename(video_path)
+        cached = self.data["sources"].get(key)
+        if (
+            cached
+            and cached["size"] == stat.st_size
+            and cached["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return cached["sha256"]
+        digest = self.file_hash(video_path)
+        self.data["sources"][key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+        }
+        return digest
+
+    @staticmethod
+    def row_hash(interval: tuple, settings: dict) -> str:
+        payload = json.dumps([list(interval), settings], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def clip_version(source_hash: str, row_hash: str) -> str:
+        return f"{source_hash}:{row_hash}"
+
+    def is_current(
+        self, clip_path: str, thumbnail_path: str, source_hash: str, row_hash: str
+    ) -> bool:
+        entry = self.data["outputs"].get(os.path.basename(clip_path))
+        return (
+            entry is not None
+            and entry["source_hash"] == source_hash
+            and entry["row_hash"] == row_hash
+            and os.path.exists(clip_path)
+            and os.path.exists(thumbnail_path)
+        )
+
+    def record(
+        self,
+        clip_path: str,
+        thumbnail_path: str,
+        source: str,
+        source_hash: str,
+        row_hash: str,
+        renditions: tuple = (),
+    ):
+        version = self.clip_version(source_hash, row_hash)
+        self.data["outputs"][os.path.basename(clip_path)] = {
+            "clip": clip_path,
+            "thumbnail": thumbnail_path,
+            "source": os.path.basename(source),
+            "source_hash": source_hash,
+            "row_hash": row_hash,
+            "renditions": {name: version for name in renditions},
+        }
+
+    def missing_renditions(self, clip_path: str, names: tuple) -> tuple:
+        """Return the renditions of a clip that are missing or out of date."""
+        entry = self.data["outputs"].get(os.path.basename(clip_path), {})
+        version = self.clip_version(entry.get("source_hash"), entry.get("row_hash"))
+        recorded = entry.get("renditions", {})
+        return tuple(
+            name
+            for name in names
+            if recorded.get(name) != version
+            or not os.path.exists(rendition_path(clip_path, name))
+        )
+
+    def record_renditions(self, clip_path: str, names: tuple):
+        """Record renditions made from the current version of a clip."""
+        entry = self.data["outputs"][os.path.basename(clip_path)]
+        version = self.clip_version(entry["source_hash"], entry["row_hash"])
+        entry.setdefault("renditions", {}).update(dict.fromkeys(names, version))
+
+    def prune(self, keep: set[str], sources: set[str]) -> list[str]:
+        """Delete recorded outputs whose clip name is not in ``keep``.
+
+        Only clips created through the manifest are considered, so files placed
+        in the processed folder by other means are never removed. Cached hashes
+        of sources not in ``sources`` are dropped.
+        """
+        removed = []
+        for name in list(self.data["outputs"]):
+            if name in keep:
+                continue
+            entry = self.data["outputs"].pop(name)
+            for path in (entry["clip"], entry["thumbnail"]):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(name)
+        for source in list(self.data["sources"]):
+            if source not in sources:
+                self.data["sources"].pop(source)
+        return removed
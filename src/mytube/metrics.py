@@ -0,0 +1,104 @@
+# %%
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# %%
+
+# Upper bounds in seconds of the histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300, 1800)
+
+
+class Metrics:
+    """Process-wide counters and timing histograms.
+
+    Stages are timed with :meth:`timer`, which records a histogram named
+    ``<stage>_seconds``. Metrics can be exported as a snapshot dictionary or as
+    Prometheus text. If ``jsonl_path`` is set, every observation is also
+    appended to that file as one JSON line, which collects metrics from worker
+    processes as well.
+    """
+
+    def __init__(self, jsonl_path: str | None = None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def _export(self, kind: str, name: str, value: float):
+        if not self.jsonl_path:
+            return
+        line = json.dumps(
+            {
+                "ts": time.time(),
+                "pid": os.getpid(),
+                "type": kind,
+                "name": name,
+                "value": value,
+            }
+        )
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            self._export("counter", name, value)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                name, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            )
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            self._export("histogram", name, value)
+
+    @contextmanager
+    def timer(self, stage: str):
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{stage}_seconds", time.perf_counter() - t_start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {
+                    name: {
+                        "buckets": dict(zip(BUCKETS, histogram["buckets"])),
+                        "sum": histogram["sum"],
+                        "count": histogram["count"],
+                    }
+                    for name, histogram in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE mytube_{name}_total counter")
+            lines.append(f"mytube_{name}_total {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE mytube_{name} histogram")
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'mytube_{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'mytube_{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"mytube_{name}_sum {histogram['sum']}")
+            lines.append(f"mytube_{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(os.environ.get("MYTUBE_METRICS_FILE") or None)
@@ -0,0 +1,61 @@
+# %%
+
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# %%
+
+
+class Prefetcher:
+    """Warm the OS page cache for clips that are likely to be played next.
+
+    Warming runs on a single background thread, so event handlers never wait
+    for disk reads. Pinned files stay memory-mapped for the lifetime of the
+    app, which keeps short, frequently played files such as the info videos
+    resident.
+    """
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, nbytes: int = 8 * 1024 * 1024):
+        self.nbytes = nbytes
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pinned = {}
+
+    def _warm(self, path: str, nbytes: int | None):
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                length = size if nbytes is None else min(size, nbytes)
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, length, os.POSIX_FADV_WILLNEED)
+                    return
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(self.READ_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+        except OSError:
+            pass
+
+    def warm(self, paths: list[str], whole: bool = False):
+        """Schedule loading the start (or the whole) of each file."""
+        nbytes = None if whole else self.nbytes
+        for path in paths:
+            self._executor.submit(self._warm, path, nbytes)
+
+    def pin(self, paths: list[str]):
+        """Keep files memory-mapped and ask the OS to load them."""
+        for path in paths:
+            if path in self._pinned or not os.path.exists(path):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                continue
+            if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                mapping.madvise(mmap.MADV_WILLNEED)
+            self._pinned[path] = mapping
@@ -1,13 +1,36 @@
 # %%
 
-from moviepy import VideoFileClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 import os
-import csv
 import datetime
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cv2
-import shutil
+import numpy as np
 
+from .ingest import MODES as INGEST_MODES, ingest_file
+from .intervals import (
+    DURATION_TOLERANCE,
+    MODES,
+    Interval,
+    IntervalError,
+    format_timestamp,
+    load_intervals,
+)
+from .library import (
+    RENDITIONS,
+    THUMBNAIL_EXTENSIONS,
+    LibraryIndex,
+    remove_renditions,
+    rendition_path,
+)
 from .logger import get_logger
+from .manifest import Manifest
+from .metrics import metrics
 
 now = datetime.datetime.now
 
@@ -15,33 +38,560 @@ now = datetime.datetime.now
 
 
 class ThumbnailGenerator:
+    FORMAT = "jpg"
+    QUALITY = 85
+    WIDTH = 480
+    # Gaps up to this many seconds are decoded forward instead of seeking
+    MAX_GRAB_SECONDS = 5
+    # Frames are scored on SCORE_SIZE x SCORE_SIZE grayscale copies
+    SCORE_SIZE = 96
+
+    @classmethod
+    def write(
+        cls, image, thumbnail_path: str, width: int = None, quality: int = None
+    ):
+        """Downscale a frame to ``width`` and encode it by its file extension.
+
+        Thumbnails of the same clip with another extension are deleted, so an
+        older one is not picked up instead of the new one.
+        """
+        width = cls.WIDTH if width is None else width
+        quality = cls.QUALITY if quality is None else quality
+        height, image_width = image.shape[:2]
+        if width and image_width > width:
+            image = cv2.resize(
+                image,
+                (width, round(height * width / image_width)),
+                interpolation=cv2.INTER_AREA,
+            )
+        extension = os.path.splitext(thumbnail_path)[1].lower()
+        params = {
+            ".jpg": [cv2.IMWRITE_JPEG_QUALITY, quality],
+            ".jpeg": [cv2.IMWRITE_JPEG_QUALITY, quality],
+            ".webp": [cv2.IMWRITE_WEBP_QUALITY, quality],
+        }.get(extension, [])
+        written = cv2.imwrite(thumbnail_path, image, params)
+        if written:
+            base_path = os.path.splitext(thumbnail_path)[0]
+            for other in THUMBNAIL_EXTENSIONS:
+                if other != extension and os.path.exists(base_path + other):
+                    os.remove(base_path + other)
+        return written
+
+    @staticmethod
+    def score_frames(gray: np.ndarray) -> np.ndarray:
+        """Score a stack of grayscale frames of shape ``(n, height, width)``.
+
+        The score combines Laplacian sharpness, contrast and how close the mean
+        brightness is to mid-gray. Black and flat frames get ``-inf``.
+        """
+        gray = gray.astype(np.float32)
+        brightness = gray.mean(axis=(1, 2))
+        contrast = gray.std(axis=(1, 2))
+        laplacian = (
+            4 * gray[:, 1:-1, 1:-1]
+            - gray[:, :-2, 1:-1]
+            - gray[:, 2:, 1:-1]
+            - gray[:, 1:-1, :-2]
+            - gray[:, 1:-1, 2:]
+        )
+        sharpness = laplacian.var(axis=(1, 2))
+        score = (
+            0.5 * sharpness / max(sharpness.max(), 1e-6)
+            + 0.3 * contrast / max(contrast.max(), 1e-6)
+            + 0.2 * (1 - np.abs(brightness - 128) / 128)
+        )
+        flat = (brightness < 16) | (contrast < 4)
+        return np.where(flat, -np.inf, score)
+
+    @classmethod
+    def _frames_at(cls, cap, times: list[float]):
+        """Yield ``(index, frame)`` for ascending ``times`` from one capture.
+
+        Short gaps are decoded forward and only long gaps are seeked. ``frame``
+        is None when the time lies beyond the end of the video.
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+        max_grab = fps * cls.MAX_GRAB_SECONDS
+        position = 0
+        for index, time in enumerate(times):
+            target = int(round(time * fps))
+            if target < position - 1 or target - position > max_grab:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            while position < target and cap.grab():
+                position += 1
+            if target == position - 1 and index > 0:
+                # Same frame as the previous sample
+                yield index, frame
+                continue
+            success, frame = cap.read()
+            position += 1
+            yield index, frame if success else None
 
     @staticmethod
-    def run(video_path: str, thumbnail_name: str = None, time: int = 10):
+    def run(
+        video_path: str, thumbnail_name: str = None, time: int = 10, samples: int = 1
+    ):
+        """Write the thumbnail of a clip.
+
+        With ``samples > 1`` that many frames spread over the clip are scored
+        and the best one is kept, otherwise the frame at ``time`` is used. Clips
+        shorter than ``2 * time`` use their middle frame.
+        """
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file {video_path} not found")
         output_dir = os.path.join(os.path.dirname(video_path), "thumbnails")
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         if thumbnail_name is None:
-            thumbnail_name = os.path.basename(video_path).replace(".mp4", ".png")
+            thumbnail_name = os.path.basename(video_path).replace(
+                ".mp4", f".{ThumbnailGenerator.FORMAT}"
+            )
         thumbnail_path = os.path.join(output_dir, thumbnail_name)
         cap = cv2.VideoCapture(video_path)
-        cap.set(cv2.CAP_PROP_POS_MSEC, time * 1000)
-        success, image = cap.read()
-        if success:
-            cv2.imwrite(thumbnail_path, image)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
         cap.release()
+        if samples > 1:
+            window = (0, duration)
+        else:
+            window = (min(time, duration / 2) if duration > 0 else time, duration)
+        ThumbnailGenerator.batch(video_path, [(*window, thumbnail_path)], samples)
         # Retrieve the thumbnail path for unknown extension based on path
         print(f"Thumbnail generated: {thumbnail_path}")
         return thumbnail_path
 
+    @classmethod
+    def batch(
+        cls,
+        video_path: str,
+        targets: list[tuple[float, float, str]],
+        samples: int = 1,
+        width: int = None,
+        quality: int = None,
+    ):
+        """Write thumbnails for several windows of one video.
+
+        ``targets`` are ``(start, end, thumbnail_path)`` with times in seconds.
+        With ``samples == 1`` the frame at ``start`` is used. Otherwise
+        ``samples`` frames spread over the window are scored with
+        :meth:`score_frames` and the best one is kept.
+
+        All sample times are visited in order with a single capture, and only
+        downscaled copies of the sampled frames are kept for scoring. Returns
+        the paths of the thumbnails that were written.
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file {video_path} not found")
+        width = cls.WIDTH if width is None else width
+        requests = []
+        for target_idx, (start, end, _) in enumerate(targets):
+            if samples > 1 and end > start:
+                step = (end - start) / samples
+                times = [start + step * (i + 0.5) for i in range(samples)]
+            else:
+                times = [start]
+            requests.extend((time, target_idx) for time in times)
+        requests.sort()
+        remaining = [0] * len(targets)
+        for _, target_idx in requests:
+            remaining[target_idx] += 1
+        candidates = [[] for _ in targets]
+        written = []
+        cap = cv2.VideoCapture(video_path)
+        try:
+            frames = cls._frames_at(cap, [time for time, _ in requests])
+            for index, frame in frames:
+                target_idx = requests[index][1]
+                if frame is not None:
+                    height, frame_width = frame.shape[:2]
+                    if width and frame_width > width:
+                        frame = cv2.resize(
+                            frame,
+                            (width, round(height * width / frame_width)),
+                            interpolation=cv2.INTER_AREA,
+                        )
+                    candidates[target_idx].append(frame)
+                remaining[target_idx] -= 1
+                if remaining[target_idx]:
+                    continue
+                thumbnail_path = targets[target_idx][2]
+                if cls._write_best(candidates[target_idx], thumbnail_path, quality):
+                    written.append(thumbnail_path)
+                candidates[target_idx] = []
+        finally:
+            cap.release()
+        return written
+
+    @classmethod
+    def _write_best(cls, frames: list, thumbnail_path: str, quality: int = None):
+        if not frames:
+            return False
+        best = 0
+        if len(frames) > 1:
+            gray = np.stack(
+                [
+                    cv2.resize(
+                        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                        (cls.SCORE_SIZE, cls.SCORE_SIZE),
+                        interpolation=cv2.INTER_AREA,
+                    )
+                    for frame in frames
+                ]
+            )
+            scores = cls.score_frames(gray)
+            if np.isfinite(scores).any():
+                best = int(np.argmax(scores))
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        return cls.write(frames[best], thumbnail_path, quality=quality)
+
+
+# %%
+
+
+class RenditionTranscoder:
+    """Write lower-bitrate renditions of a clip for playback on weak connections.
+
+    Renditions are H.264/AAC mp4 files with the moov atom at the front
+    (faststart), so players can start before the whole file is loaded.
+    """
+
+    @staticmethod
+    def run(clip_path: str, names: tuple = tuple(RENDITIONS)) -> list[str]:
+        if not os.path.exists(clip_path):
+            raise FileNotFoundError(f"Video file {clip_path} not found")
+        written = []
+        for name in names:
+            height, bitrate = RENDITIONS[name]
+            output_path = rendition_path(clip_path, name)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tmp_path = f"{output_path}.tmp.mp4"
+            cmd = [
+                FFMPEG_BINARY,
+                "-y",
+                "-loglevel",
+                "error",
+                "-i",
+                clip_path,
+                "-vf",
+                f"scale=-2:min({height}\\,ih)",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-b:v",
+                f"{bitrate}k",
+                "-maxrate",
+                f"{bitrate * 3 // 2}k",
+                "-bufsize",
+                f"{bitrate * 2}k",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "96k",
+                "-movflags",
+                "+faststart",
+                tmp_path,
+            ]
+            subprocess.run(cmd, check=True)
+            os.replace(tmp_path, output_path)
+            written.append(output_path)
+        return written
+
+
+class StreamingEncoder:
+    """Re-encode clips of a source through a fixed pool of frame buffers.
+
+    A decoder process streams raw RGB frames of a window of the source, a
+    reader thread fills them into ``buffers`` preallocated arrays and the
+    encoder processes of the clips in the window consume them. Buffers go
+    back to the pool once written, so at most ``buffers`` frames are held in
+    memory regardless of the length of the source. Audio is read by each
+    encoder directly from the source window of its clip.
+    """
+
+    # Clips closer than this many seconds are decoded in one pass
+    MAX_GAP = 5
+
+    def __init__(self, video_path: str, threads: int | None = None, buffers: int = 4):
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file {video_path} not found")
+        self.video_path = video_path
+        self.threads = threads
+        self.buffers = buffers
+        infos = ffmpeg_parse_infos(video_path)
+        width, height = infos["video_size"]
+        # ffmpeg autorotates decoded frames by the rotation of the stream
+        if round(infos.get("video_rotation", 0)) % 180 == 90:
+            width, height = height, width
+        self.size = (width, height)
+        self.fps = infos["video_fps"]
+        self.has_audio = infos["audio_found"]
+        self._pool = None
+
+    def frames(self, start: float, duration: float):
+        """Yield the frames of a window as pooled ``(height, width, 3)`` arrays.
+
+        A yielded array is reused for a later frame once it is handed back with
+        :meth:`release`. The time spent reading from the decoder is recorded
+        as the ``decode`` stage. Raises :class:`subprocess.CalledProcessError`
+        if the decoder fails and :class:`OSError` if it delivers clearly fewer
+        frames than the window holds, e.g. for a truncated source.
+        """
+        width, height = self.size
+        if self._pool is None:
+            self._pool = queue.Queue()
+            for _ in range(self.buffers):
+                self._pool.put(np.empty((height, width, 3), dtype=np.uint8))
+        cmd = [
+            FFMPEG_BINARY,
+            "-loglevel",
+            "error",
+            "-ss",
+            f"{start:.3f}",
+            "-t",
+            f"{duration:.3f}",
+            "-i",
+            self.video_path,
+            "-an",
+            "-r",
+            f"{self.fps}",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-",
+        ]
+        decoding = 0.0
+        n_frames = 0
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE) as decoder:
+            try:
+                while True:
+                    frame = self._pool.get()
+                    view = memoryview(frame).cast("B")
+                    filled = 0
+                    t_start = time.perf_counter()
+                    while filled < len(view):
+                        n = decoder.stdout.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    decoding += time.perf_counter() - t_start
+                    if filled < len(view):
+                        self._pool.put(frame)
+                        break
+                    n_frames += 1
+                    yield frame
+                if decoder.wait():
+                    raise subprocess.CalledProcessError(decoder.returncode, cmd)
+                # The source may end up to DURATION_TOLERANCE before the window
+                expected = duration * self.fps
+                if n_frames < expected - self.fps * DURATION_TOLERANCE - 1:
+                    raise OSError(
+                        f"Decoded only {n_frames} of {expected:.0f} frames of "
+                        f"{self.video_path} from {format_timestamp(start)}"
+                    )
+            finally:
+                decoder.stdout.close()
+                decoder.kill()
+                metrics.observe("decode_seconds", decoding)
+
+    def release(self, frame: np.ndarray):
+        """Return a frame obtained from :meth:`frames` to the buffer pool."""
+        self._pool.put(frame)
+
+    def _encoder_cmd(self, start: float, end: float, output_path: str) -> list:
+        width, height = self.size
+        duration = end - start
+        cmd = [
+            FFMPEG_BINARY,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            f"{self.fps}",
+            "-i",
+            "-",
+        ]
+        if self.has_audio:
+            cmd += [
+                "-ss",
+                f"{start:.3f}",
+                "-t",
+                f"{duration:.3f}",
+                "-i",
+                self.video_path,
+                "-map",
+                "0:v:0",
+                "-map",
+                "1:a:0",
+                "-c:a",
+                "aac",
+            ]
+        cmd += ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        if self.threads:
+            cmd += ["-threads", str(self.threads)]
+        cmd += ["-movflags", "+faststart", "-f", "mp4", output_path]
+        return cmd
+
+    @staticmethod
+    def _close(encoder: subprocess.Popen, cmd: list):
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass  # The encoder exited early, its return code is checked below
+        if encoder.wait():
+            raise subprocess.CalledProcessError(encoder.returncode, cmd)
+
+    def windows(self, clips: list) -> list:
+        """Merge ``(start, end, output_path)`` clips into windows decoded at once.
+
+        Clips that overlap or lie less than ``MAX_GAP`` seconds apart share a
+        window. Returns ``(start, end, clips)`` with the clips sorted by start.
+        """
+        windows = []
+        for clip in sorted(clips, key=lambda clip: clip[0]):
+            if windows and clip[0] <= windows[-1][1] + self.MAX_GAP:
+                windows[-1][1] = max(windows[-1][1], clip[1])
+                windows[-1][2].append(clip)
+            else:
+                windows.append([clip[0], clip[1], [clip]])
+        return [tuple(window) for window in windows]
+
+    def encode(self, start: float, end: float, output_path: str):
+        """Write the window ``[start, end]`` of the source as an H.264/AAC mp4."""
+        self.encode_many([(start, end, output_path)])
+
+    def encode_many(self, clips: list):
+        """Write ``(start, end, output_path)`` clips of the source as H.264/AAC mp4s.
+
+        The source is decoded once per window (see :meth:`windows`) in start
+        order, and every frame is written to the encoders of all clips that
+        contain it, so overlapping clips do not decode the same frames twice.
+        """
+        for start, end, window_clips in self.windows(clips):
+            self._encode_window(start, end, window_clips)
+
+    def _encode_window(self, start: float, end: float, clips: list):
+        # First and last frame index of every clip within the window
+        pending = [
+            (
+                round((clip_start - start) * self.fps),
+                round((clip_end - start) * self.fps),
+                self._encoder_cmd(clip_start, clip_end, output_path),
+            )
+            for clip_start, clip_end, output_path in clips
+        ]
+        # The reader thread only runs ahead by the number of pooled buffers
+        filled = queue.Queue(maxsize=self.buffers)
+        stop = threading.Event()
+        errors = []
+
+        def read():
+            try:
+                for frame in self.frames(start, end - start):
+                    if stop.is_set():
+                        self.release(frame)
+                        break
+                    filled.put(frame)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                filled.put(None)
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        encoders = []
+        active = []
+        frame = None
+        done = False
+        index = 0
+        try:
+            while (frame := filled.get()) is not None:
+                while pending and pending[0][0] <= index:
+                    _, last, cmd = pending.pop(0)
+                    encoder = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+                    encoders.append(encoder)
+                    active.append((last, encoder, cmd))
+                for _, encoder, cmd in active:
+                    try:
+                        encoder.stdin.write(frame.data)
+                    except BrokenPipeError:
+                        self._close(encoder, cmd)
+                self.release(frame)
+                frame = None
+                index += 1
+                for clip in [clip for clip in active if clip[0] <= index]:
+                    active.remove(clip)
+                    self._close(*clip[1:])
+            done = True
+            if not errors:
+                # The source may end a few frames before the last clip
+                for _, encoder, cmd in active:
+                    self._close(encoder, cmd)
+                if pending:
+                    raise OSError(
+                        f"No frames decoded for {pending[0][2][-1]} from "
+                        f"{self.video_path}"
+                    )
+        finally:
+            # On failure, hand back the pending frames so the reader can stop
+            stop.set()
+            if frame is not None:
+                self.release(frame)
+            while not done:
+                frame = filled.get()
+                if frame is None:
+                    done = True
+                else:
+                    self.release(frame)
+            reader.join()
+            for encoder in encoders:
+                if encoder.poll() is None:
+                    encoder.kill()
+                    encoder.wait()
+                if encoder.stdin and not encoder.stdin.closed:
+                    try:
+                        encoder.stdin.close()
+                    except BrokenPipeError:
+                        pass
+        if errors:
+            raise errors[0]
+
 
 # %%
 
 
 class VideoCutter:
-    def __init__(self, video_path: str):
+    MODES = MODES
+
+    def __init__(
+        self,
+        video_path: str,
+        mode: str = "encode",
+        threads: int | None = None,
+        log_name: str = "v_cut",
+        thumbnail_offset: float = 10,
+        thumbnail_samples: int = 1,
+        renditions: tuple = (),
+        intervals: list[Interval] | None = None,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(
+                f"Unknown cutting mode {mode!r}, expected one of {self.MODES}"
+            )
+        self.mode = mode
+        self.threads = threads
+        self.thumbnail_offset = thumbnail_offset
+        self.thumbnail_samples = thumbnail_samples
+        self.renditions = tuple(renditions)
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file {video_path} not found")
         self.video_path = video_path
@@ -49,35 +599,149 @@ class VideoCutter:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         self.csv_path = video_path.replace(".mp4", ".csv")
-        if not os.path.exists(self.csv_path):
-            raise FileNotFoundError(f"CSV file {self.csv_path} not found")
-        self.intervals = self.read_intervals_from_csv()
-        self.logger = get_logger("v_cut")
-
-    def read_intervals_from_csv(self):
-        intervals = []
-        with open(self.csv_path, newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                start = (int(row["Start_min"]), int(row["Start_sec"]))
-                end = (int(row["End_min"]), int(row["End_sec"]))
-                name = row["Name"]
-                intervals.append((start, end, name))
+        self.logger = get_logger(log_name)
+        if intervals is None:
+            if not os.path.exists(self.csv_path):
+                raise FileNotFoundError(f"CSV file {self.csv_path} not found")
+            intervals = self.read_intervals_from_csv()
+        self.intervals = intervals
+
+    def read_intervals_from_csv(self) -> list[Interval]:
+        """Read and validate the intervals against the source duration."""
+        duration = ffmpeg_parse_infos(self.video_path)["duration"]
+        intervals, warnings = load_intervals(self.csv_path, duration)
+        for warning in warnings:
+            self.logger.warning(f"{self.csv_path}: {warning}")
         return intervals
 
-    def process_intervals(self):
-        # TODO: works, but needs improvement
+    def sorted_intervals(self) -> list[Interval]:
+        """Return intervals ordered by start time (stable for equal starts)."""
+        return sorted(self.intervals, key=lambda interval: interval.start)
+
+    def output_paths(self, interval: Interval) -> tuple[str, str]:
+        """Return the clip and thumbnail paths produced for an interval."""
         base_name = os.path.splitext(os.path.basename(self.video_path))[0]
-        for idx, (start, end, name) in enumerate(self.intervals):
-            self.logger.info(f"Processing clip {idx + 1}: {start} - {end} ({name})")
-            video = VideoFileClip(self.video_path)
-            subclip: VideoFileClip = video.subclipped(start, end)
-            output_path = os.path.join(self.output_dir, f"{base_name}_{name}.mp4")
-            subclip.write_videofile(output_path)
-            subclip.close()
-            thumbnail_name = f"{base_name}_{name}.png"
-            ThumbnailGenerator.run(output_path, thumbnail_name)
-            video.close()
+        name = interval.name
+        clip_path = os.path.join(self.output_dir, f"{base_name}_{name}.mp4")
+        thumbnail_path = os.path.join(
+            self.output_dir,
+            "thumbnails",
+            f"{base_name}_{name}.{ThumbnailGenerator.FORMAT}",
+        )
+        return clip_path, thumbnail_path
+
+    def thumbnail_window(self, interval: Interval) -> tuple[float, float]:
+        """Return the source time window searched for the thumbnail of an interval.
+
+        A ``thumbnail`` option of the interval fixes the time into the clip.
+        Otherwise, with a single sample the thumbnail is taken
+        ``thumbnail_offset`` seconds into the clip, or in the middle of clips
+        that are shorter than twice the offset. With several samples the whole
+        clip is searched.
+        """
+        start, end = interval.start, interval.end
+        if "thumbnail" in interval.options:
+            time = start + interval.options["thumbnail"]
+            return time, time
+        if self.thumbnail_samples > 1:
+            return start, end
+        return start + min(self.thumbnail_offset, max(0, end - start) / 2), end
+
+    def copy_clip(self, start: float, end: float, output_path: str):
+        """Remux a clip without re-encoding.
+
+        The input seek snaps the start to the preceding keyframe, so the clip may
+        begin slightly before the requested start. Video and audio packets are
+        copied as they are, which makes the cut bound by I/O instead of CPU.
+        """
+        t_start = start
+        duration = end - start
+        cmd = [
+            FFMPEG_BINARY,
+            "-y",
+            "-loglevel",
+            "error",
+            "-ss",
+            f"{t_start:.3f}",
+            "-i",
+            self.video_path,
+            "-t",
+            f"{duration:.3f}",
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-avoid_negative_ts",
+            "make_zero",
+            "-movflags",
+            "+faststart",
+            "-f",
+            "mp4",
+            output_path,
+        ]
+        subprocess.run(cmd, check=True)
+
+    def process_intervals(self):
+        """Cut all intervals of the source in order of their start time.
+
+        In ``encode`` mode the clips are streamed through a
+        :class:`StreamingEncoder`, which decodes the source once in start order
+        into a small pool of reused frame buffers and feeds every frame to the
+        encoders of all clips that contain it, so memory stays flat for sources
+        of any length and overlapping clips are decoded only once. In ``copy``
+        mode no decoding takes place, every clip is remuxed with
+        :meth:`copy_clip`. A ``mode`` or ``renditions`` option of an interval
+        overrides the setting of the cutter for that clip. Clips are written to
+        temporary names and moved in place once all of them are complete, so
+        the library never picks up a partial file. Renditions left from an
+        earlier cut of a clip are deleted before it is written. Thumbnails of
+        all clips are taken afterwards from the source in one sequential pass
+        with :meth:`ThumbnailGenerator.batch`.
+        """
+        thumbnail_targets = []
+        encode_targets = []
+        written = []
+        try:
+            for idx, interval in enumerate(self.sorted_intervals()):
+                start, end, name, options = interval
+                self.logger.info(
+                    f"Processing clip {idx + 1}: {format_timestamp(start)} - "
+                    f"{format_timestamp(end)} ({name})"
+                )
+                output_path, thumbnail_path = self.output_paths(interval)
+                remove_renditions(output_path)
+                tmp_path = f"{output_path}.tmp"
+                written.append((tmp_path, output_path, interval))
+                if options.get("mode", self.mode) == "copy":
+                    with metrics.timer("copy"):
+                        self.copy_clip(start, end, tmp_path)
+                else:
+                    encode_targets.append((start, end, tmp_path))
+                thumbnail_targets.append(
+                    (*self.thumbnail_window(interval), thumbnail_path)
+                )
+            if encode_targets:
+                encoder = StreamingEncoder(self.video_path, threads=self.threads)
+                with metrics.timer("encode"):
+                    encoder.encode_many(encode_targets)
+            for tmp_path, output_path, _ in written:
+                os.replace(tmp_path, output_path)
+                metrics.count("clips_written")
+        finally:
+            for tmp_path, _, _ in written:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        for _, output_path, interval in written:
+            renditions = interval.options.get("renditions", self.renditions)
+            if renditions:
+                with metrics.timer("transcode"):
+                    RenditionTranscoder.run(output_path, renditions)
+        with metrics.timer("thumbnail"):
+            ThumbnailGenerator.batch(
+                self.video_path, thumbnail_targets, samples=self.thumbnail_samples
+            )
 
     def run(self):
         t_1 = now()
@@ -89,33 +753,318 @@ class VideoCutter:
         self.logger.info("Done")
 
 
+def _cut_job(
+    video_path: str,
+    cutter_options: dict,
+    threads: int | None,
+    intervals: list,
+    job_name: str,
+):
+    """Cut the given intervals of a source video.
+
+    Runs inside a worker process. Errors are returned instead of raised so that
+    a failing job does not affect the others.
+    """
+    try:
+        vc = VideoCutter(
+            video_path,
+            threads=threads,
+            log_name=f"v_cut:{job_name}",
+            intervals=intervals,
+            **cutter_options,
+        )
+        vc.run()
+        return job_name, None
+    except Exception as e:
+        return job_name, f"{type(e).__name__}: {e}"
+
+
 class VideosProcessor:
 
-    def __init__(self, videos_dir: str = "videos"):
+    def __init__(
+        self,
+        videos_dir: str = "videos",
+        mode: str = "encode",
+        max_workers: int | None = None,
+        incremental: bool = True,
+        thumbnail_samples: int = 1,
+        renditions: tuple = (),
+        ingest: str = "link",
+        prune_missing: bool = False,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cutting mode {mode!r}, expected one of {MODES}")
+        if ingest not in INGEST_MODES:
+            raise ValueError(
+                f"Unknown ingest mode {ingest!r}, expected one of {INGEST_MODES}"
+            )
         self.videos_dir = videos_dir
+        self.ingest = ingest
+        self.mode = mode
+        self.max_workers = max_workers
+        self.incremental = incremental
+        self.prune_missing = prune_missing
+        self.renditions = tuple(renditions)
+        self.cutter_options = {
+            "mode": mode,
+            "thumbnail_samples": thumbnail_samples,
+            "renditions": self.renditions,
+        }
+        # Renditions are tracked per clip in the manifest, not in the row hash
+        self.settings = {
+            "mode": mode,
+            "thumbnail_samples": thumbnail_samples,
+            "thumbnail": [
+                ThumbnailGenerator.FORMAT,
+                ThumbnailGenerator.WIDTH,
+                ThumbnailGenerator.QUALITY,
+            ],
+        }
+        self.library = LibraryIndex(os.path.join(videos_dir, "processed"))
         self.logger = get_logger("v_pro")
 
     def get_video_files(self):
         return [f for f in os.listdir(self.videos_dir) if f.endswith(".mp4")]
 
-    def run(self):
-        video_files = self.get_video_files()
-        for video_file in video_files:
+    def load_specs(self, sources: list[str] | None = None) -> tuple[list, dict]:
+        """Read and validate the intervals of every source before cutting.
+
+        Returns the list of ``(video_path, intervals)`` of all valid sources
+        and a dict mapping the remaining sources to the reason they are
+        skipped, such as a missing CSV or an invalid row. ``sources`` limits
+        the check to these video file names.
+        """
+        specs = []
+        skipped = {}
+        video_files = self.get_video_files() if sources is None else sources
+        for video_file in sorted(video_files):
             video_path = f"{self.videos_dir}/{video_file}"
-            self.logger.info(f"Processing {video_path}")
-            vc = VideoCutter(video_path)
-            vc.run()
+            csv_path = video_path.replace(".mp4", ".csv")
+            if not os.path.exists(csv_path):
+                skipped[video_path] = f"CSV file {csv_path} not found"
+                continue
+            try:
+                duration = ffmpeg_parse_infos(video_path)["duration"]
+                intervals, warnings = load_intervals(csv_path, duration)
+            except (IntervalError, OSError) as e:
+                skipped[video_path] = str(e)
+                continue
+            for warning in warnings:
+                self.logger.warning(f"{csv_path}: {warning}")
+            specs.append((video_path, intervals))
+        for video_path, reason in skipped.items():
+            self.logger.error(f"Skipping {video_path}: {reason}")
+        return specs, skipped
+
+    def _row_hash(self, manifest: Manifest, interval) -> str:
+        options = {k: v for k, v in interval.options.items() if k != "renditions"}
+        return manifest.row_hash(interval._replace(options=options), self.settings)
+
+    def _renditions(self, interval) -> tuple:
+        return tuple(interval.options.get("renditions", self.renditions))
+
+    def _plan(self, manifest: Manifest, specs: list):
+        """Collect the intervals that need cutting for every source.
+
+        Returns the list of ``(video_path, intervals)`` to cut, the names of
+        all clips that the current CSV files define and the list of
+        ``(clip_path, renditions)`` still to transcode for up-to-date clips.
+        """
+        plan = []
+        expected = set()
+        transcode = []
+        for video_path, intervals in specs:
+            vc = VideoCutter(video_path, intervals=intervals, **self.cutter_options)
+            source_hash = manifest.source_hash(video_path)
+            stale = []
+            for interval in vc.sorted_intervals():
+                clip_path, thumbnail_path = vc.output_paths(interval)
+                expected.add(os.path.basename(clip_path))
+                row_hash = self._row_hash(manifest, interval)
+                if not self.incremental or not manifest.is_current(
+                    clip_path, thumbnail_path, source_hash, row_hash
+                ):
+                    stale.append(interval)
+                    continue
+                missing = manifest.missing_renditions(
+                    clip_path, self._renditions(interval)
+                )
+                if missing:
+                    transcode.append((clip_path, missing))
+            if stale:
+                plan.append((video_path, stale))
+            else:
+                self.logger.info(f"Up to date: {video_path}")
+        return plan, expected, transcode
+
+    def _record(self, manifest: Manifest, video_path: str, intervals: list):
+        vc = VideoCutter(video_path, intervals=intervals, **self.cutter_options)
+        source_hash = manifest.source_hash(video_path)
+        for interval in intervals:
+            clip_path, thumbnail_path = vc.output_paths(interval)
+            manifest.record(
+                clip_path,
+                thumbnail_path,
+                video_path,
+                source_hash,
+                self._row_hash(manifest, interval),
+                self._renditions(interval),
+            )
+            self.library.add(clip_path, thumbnail_path, interval.duration)
+        manifest.save()
+
+    def check(self) -> dict:
+        """Validate the CSV files of all sources without cutting anything.
+
+        Returns the sources that would be skipped, see :meth:`load_specs`.
+        """
+        return self.load_specs()[1]
+
+    def run(self, sources: list[str] | None = None) -> dict:
+        """Cut all sources with valid CSV files.
+
+        All CSV files are validated before the first clip is cut. Sources with
+        a missing or invalid CSV are skipped and their existing clips are kept.
+        Clips whose row was removed from the CSV of a present source are
+        deleted. Clips of sources that are no longer in the folder are kept
+        unless ``prune_missing`` is set. With ``sources``, only these video
+        file names are cut and no clips are deleted. Returns the skipped
+        sources, see :meth:`load_specs`.
+        """
+        manifest = Manifest(
+            os.path.join(self.videos_dir, "processed", Manifest.FILE_NAME)
+        )
+        specs, skipped = self.load_specs(sources)
+        plan, expected, transcode = self._plan(manifest, specs)
+        if self.max_workers is not None and self.max_workers > 1:
+            self.run_parallel(plan, manifest)
+        else:
+            for video_path, intervals in plan:
+                self.logger.info(f"Processing {video_path}")
+                vc = VideoCutter(video_path, intervals=intervals, **self.cutter_options)
+                vc.run()
+                self._record(manifest, video_path, intervals)
+        for clip_path, names in transcode:
+            self.logger.info(f"Adding renditions {', '.join(names)} of {clip_path}")
+            with metrics.timer("transcode"):
+                RenditionTranscoder.run(clip_path, names)
+            manifest.record_renditions(clip_path, names)
+        if sources is None:
+            self._prune(manifest, expected, skipped)
+        manifest.save()
+        if skipped:
+            self.logger.warning(f"Skipped sources: {', '.join(sorted(skipped))}")
         self.logger.info("All videos processed")
+        return skipped
+
+    def _prune(self, manifest: Manifest, expected: set[str], skipped: dict):
+        """Delete the recorded clips that are no longer defined by a CSV."""
+        sources = set(self.get_video_files())
+        skipped_sources = {os.path.basename(path) for path in skipped}
+        for name, entry in manifest.data["outputs"].items():
+            missing = entry["source"] not in sources
+            if entry["source"] in skipped_sources or (
+                missing and not self.prune_missing
+            ):
+                expected.add(name)
+        for name in manifest.prune(expected, sources):
+            self.library.remove(name)
+            remove_renditions(os.path.join(self.videos_dir, "processed", name))
+            self.logger.info(f"Removed orphaned clip {name}")
+
+    def _plan_jobs(self, plan: list):
+        """Split sources into jobs so that all workers get something to do.
+
+        With fewer sources than workers, the sorted intervals of a source are
+        split into contiguous chunks, so each job still reads its part of the
+        source forward.
+        """
+        n_parts = max(1, -(-self.max_workers // max(1, len(plan))))
+        jobs = []
+        for video_path, intervals in plan:
+            base_name = os.path.splitext(os.path.basename(video_path))[0]
+            source_parts = min(n_parts, len(intervals))
+            size = -(-len(intervals) // source_parts)
+            for part in range(source_parts):
+                chunk = intervals[part * size : (part + 1) * size]
+                if not chunk:
+                    continue
+                job_name = (
+                    base_name
+                    if source_parts == 1
+                    else f"{base_name}[{part + 1}/{source_parts}]"
+                )
+                jobs.append((video_path, chunk, job_name))
+        return jobs
+
+    def run_parallel(self, plan: list, manifest: Manifest):
+        """Process the planned intervals on a pool of ``max_workers`` processes.
+
+        Encoder threads are divided between the workers to avoid oversubscribing
+        the CPU. A summary of succeeded and failed jobs is logged at the end.
+        """
+        jobs = self._plan_jobs(plan)
+        threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.logger.info(
+            f"Processing {len(jobs)} jobs on {self.max_workers} workers "
+            f"({threads} encoder threads each)"
+        )
+        t_1 = now()
+        failed = []
+        n_clips = 0
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _cut_job,
+                    video_path,
+                    self.cutter_options,
+                    threads,
+                    intervals,
+                    job_name,
+                ): (video_path, intervals, job_name)
+                for video_path, intervals, job_name in jobs
+            }
+            for future in as_completed(futures):
+                video_path, intervals, job_name = futures[future]
+                try:
+                    _, error = future.result()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                if error:
+                    metrics.count("jobs_failed")
+                    failed.append(job_name)
+                    self.logger.error(f"Job {job_name} failed: {error}")
+                else:
+                    n_clips += len(intervals)
+                    self._record(manifest, video_path, intervals)
+                    self.logger.info(f"Job {job_name} done ({len(intervals)} clips)")
+        self.logger.info(
+            f"Summary: {len(jobs) - len(failed)} of {len(jobs)} jobs succeeded, "
+            f"{n_clips} clips written, duration {now() - t_1}"
+        )
+        if failed:
+            self.logger.warning(f"Failed jobs: {', '.join(sorted(failed))}")
 
     def simple_pass(self, video_name: str):
+        """Add a whole source video to the library without cutting it.
+
+        The video is placed in the processed folder according to ``ingest``,
+        see :func:`ingest_file`. By default it is cloned or hardlinked, which
+        takes neither time nor space when both folders share a filesystem.
+        """
         path = os.path.join(self.videos_dir, video_name)
         if not os.path.exists(path):
             raise FileNotFoundError(f"Video file {path} not found")
         processed_dir = os.path.join(self.videos_dir, "processed")
         os.makedirs(processed_dir, exist_ok=True)
-        shutil.copy(path, processed_dir)
         path_processed = os.path.join(processed_dir, video_name)
-        ThumbnailGenerator.run(path_processed)
+        with metrics.timer("ingest"):
+            method = ingest_file(path, path_processed, self.ingest)
+        self.logger.info(f"Ingested {video_name} ({method})")
+        thumbnail_path = ThumbnailGenerator.run(path_processed)
+        if self.renditions:
+            RenditionTranscoder.run(path_processed, self.renditions)
+        self.library.add(path_processed, thumbnail_path)
 
 
 # %%
@@ -0,0 +1,206 @@
+# %%
+
+import csv
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from .intervals import write_intervals
+from .logger import get_logger
+from .metrics import metrics
+
+# %%
+
+
+class AutoSegmenter:
+    """Propose clip intervals of a source from scene changes and silences.
+
+    Frames are decoded by ffmpeg at ``fps`` frames per second, downscaled to
+    ``SIZE`` grayscale, and compared in blocks of ``BLOCK`` frames by the
+    difference of their histograms. Audio is decoded as 8 kHz mono and split
+    into windows whose level is compared against ``silence_db``. Both streams
+    are read in fixed-size chunks, so memory does not grow with the source.
+
+    Scene changes and the middle of silences become candidate boundaries.
+    Clips are formed by walking the boundaries and closing a clip at the first
+    boundary at least ``min_length`` seconds after its start; silent lead-in
+    and tail are trimmed from every clip.
+    """
+
+    SIZE = (64, 36)
+    BINS = 32
+    BLOCK = 256
+    SAMPLE_RATE = 8000
+    WINDOW = 0.1
+
+    def __init__(
+        self,
+        fps: float = 4,
+        scene_threshold: float = 0.35,
+        silence_db: float = -40,
+        min_silence: float = 1.0,
+        min_length: float = 30,
+        log_name: str = "v_seg",
+    ):
+        self.fps = fps
+        self.scene_threshold = scene_threshold
+        self.silence_db = silence_db
+        self.min_silence = min_silence
+        self.min_length = min_length
+        self.logger = get_logger(log_name)
+
+    def _ffmpeg(self, video_path: str, *args: str) -> subprocess.Popen:
+        cmd = [FFMPEG_BINARY, "-loglevel", "error", "-i", video_path, *args, "-"]
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+    @classmethod
+    def histogram_distance(cls, frames: np.ndarray) -> np.ndarray:
+        """Return the histogram distance between consecutive frames in [0, 1].
+
+        ``frames`` has shape ``(n, height, width)`` and dtype uint8. The result
+        has ``n - 1`` entries.
+        """
+        n = len(frames)
+        bins = frames.reshape(n, -1) // (256 // cls.BINS)
+        offsets = np.arange(n)[:, None] * cls.BINS
+        hist = np.bincount((bins + offsets).ravel(), minlength=n * cls.BINS)
+        hist = hist.reshape(n, cls.BINS) / bins.shape[1]
+        return 0.5 * np.abs(np.diff(hist, axis=0)).sum(axis=1)
+
+    def scene_changes(self, video_path: str) -> list[float]:
+        """Return the times in seconds at which the picture changes abruptly."""
+        width, height = self.SIZE
+        frame_size = width * height
+        decoder = self._ffmpeg(
+            video_path,
+            "-an",
+            "-vf",
+            f"fps={self.fps},scale={width}:{height}",
+            "-pix_fmt",
+            "gray",
+            "-f",
+            "rawvideo",
+        )
+        changes = []
+        previous = None
+        offset = 0
+        with decoder:
+            while True:
+                data = decoder.stdout.read(frame_size * self.BLOCK)
+                n = len(data) // frame_size
+                if not n:
+                    break
+                block = np.frombuffer(data[: n * frame_size], np.uint8)
+                block = block.reshape(n, height, width)
+                if previous is not None:
+                    block = np.concatenate([previous, block])
+                distance = self.histogram_distance(block)
+                first = offset - (previous is not None)
+                for idx in np.flatnonzero(distance > self.scene_threshold):
+                    changes.append(float(first + idx + 1) / self.fps)
+                previous = block[-1:]
+                offset += n
+        return changes
+
+    def silences(self, video_path: str) -> list[tuple[float, float]]:
+        """Return ``(start, end)`` of silences lasting at least ``min_silence``."""
+        window = int(self.SAMPLE_RATE * self.WINDOW)
+        decoder = self._ffmpeg(
+            video_path,
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(self.SAMPLE_RATE),
+            "-f",
+            "s16le",
+        )
+        threshold = 32768 * 10 ** (self.silence_db / 20)
+        silences = []
+        start = None
+        n_windows = 0
+        with decoder:
+            while True:
+                data = decoder.stdout.read(2 * window * 1024)
+                n = len(data) // (2 * window)
+                if not n:
+                    break
+                samples = np.frombuffer(data[: n * 2 * window], np.int16)
+                samples = samples.reshape(n, window).astype(np.float32)
+                rms = np.sqrt((samples**2).mean(axis=1))
+                for idx, silent in enumerate(rms < threshold):
+                    time = (n_windows + idx) * self.WINDOW
+                    if silent and start is None:
+                        start = time
+                    elif not silent and start is not None:
+                        if time - start >= self.min_silence:
+                            silences.append((start, time))
+                        start = None
+                n_windows += n
+        end = n_windows * self.WINDOW
+        if start is not None and end - start >= self.min_silence:
+            silences.append((start, end))
+        return silences
+
+    def propose(self, video_path: str) -> list[tuple[float, float, str]]:
+        """Return proposed ``(start, end, name)`` intervals in seconds."""
+        with metrics.timer("segment"), ThreadPoolExecutor(max_workers=1) as pool:
+            # Video and audio are decoded by separate ffmpeg processes at once
+            cuts = pool.submit(self.scene_changes, video_path)
+            silences = self.silences(video_path)
+            cuts = cuts.result()
+        duration = ffmpeg_parse_infos(video_path)["duration"]
+        candidates = {*cuts, *((start + end) / 2 for start, end in silences)}
+        boundaries = sorted(t for t in candidates if 0 < t < duration)
+        intervals = []
+        start = 0.0
+        for boundary in boundaries + [duration]:
+            if boundary - start >= self.min_length:
+                intervals.append((start, boundary))
+                start = boundary
+        if start < duration:
+            # Attach the short remainder to the last clip
+            if intervals:
+                start = intervals.pop()[0]
+            intervals.append((start, duration))
+        proposed = []
+        for start, end in intervals:
+            for silence_start, silence_end in silences:
+                if silence_start <= start < silence_end:
+                    start = silence_end
+                if silence_start < end <= silence_end:
+                    end = silence_start
+            if end - start >= 1:
+                proposed.append((start, end, f"{len(proposed) + 1:02d}"))
+        self.logger.info(
+            f"{video_path}: {len(cuts)} scene changes, {len(silences)} silences, "
+            f"{len(proposed)} clips proposed"
+        )
+        return proposed
+
+    @staticmethod
+    def needs_intervals(csv_path: str) -> bool:
+        """Whether a CSV is missing or only holds the header."""
+        if not os.path.exists(csv_path):
+            return True
+        with open(csv_path, newline="") as f:
+            return next(csv.DictReader(f), None) is None
+
+    def run(self, video_path: str, overwrite: bool = False) -> str | None:
+        """Write proposed intervals to the CSV next to ``video_path``.
+
+        CSVs that already have rows are kept unless ``overwrite`` is set.
+        Returns the CSV path if it was written.
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file {video_path} not found")
+        csv_path = video_path.replace(".mp4", ".csv")
+        if not overwrite and not self.needs_intervals(csv_path):
+            self.logger.info(f"Keeping existing intervals in {csv_path}")
+            return None
+        write_intervals(csv_path, self.propose(video_path))
+        return csv_path
@@ -0,0 +1,176 @@
+# %%
+
+import atexit
+import copy
+import json
+import sqlite3
+import threading
+
+from .metrics import metrics
+
+# %%
+
+DEFAULT_PROFILE = "default"
+
+
+class ProfileStateStore:
+    """Web app state per profile, cached in memory and stored in SQLite.
+
+    Every profile (e.g. one per child) has its own row with counter, seen videos
+    and video limit. A profile is read from the database once and then served
+    from memory; updates run under a per-profile lock, so concurrent sessions
+    never lose updates. Changed profiles are written behind in one transaction
+    once no further change happened for ``delay`` seconds, and on interpreter
+    exit. The database runs in WAL mode with ``synchronous=NORMAL``: commits do
+    not wait for an fsync, and a crash rolls back to the last committed state
+    instead of leaving a truncated file. The cache assumes that this process is
+    the only writer of the database.
+    """
+
+    def __init__(self, path: str, default: dict, delay: float = 0.5):
+        self.path = path
+        self.default = dict(default)
+        self.delay = delay
+        self._local = threading.local()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._cache = {}
+        self._dirty = set()
+        self._timer = None
+        self._writer = None
+        self._flush_lock = threading.Lock()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "profile TEXT PRIMARY KEY, counter INTEGER NOT NULL, "
+            "seen_videos TEXT NOT NULL, n_max_videos INTEGER NOT NULL)"
+        )
+        atexit.register(self.flush)
+
+    def _open(self, **kwargs) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, **kwargs
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._open()
+            self._local.connection = connection
+        return connection
+
+    def _lock(self, profile: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(profile, threading.Lock())
+
+    def _read(self, connection: sqlite3.Connection, profile: str) -> dict:
+        row = connection.execute(
+            "SELECT counter, seen_videos, n_max_videos FROM profiles "
+            "WHERE profile = ?",
+            (profile,),
+        ).fetchone()
+        if row is None:
+            return dict(self.default, seen_videos=list(self.default["seen_videos"]))
+        counter, seen_videos, n_max_videos = row
+        return {
+            "counter": counter,
+            "seen_videos": json.loads(seen_videos),
+            "n_max_videos": n_max_videos,
+        }
+
+    def _cached(self, profile: str) -> dict:
+        """Return the cached state of a profile; the profile lock must be held."""
+        state = self._cache.get(profile)
+        if state is None:
+            with metrics.timer("state_io"):
+                state = self._read(self._connect(), profile)
+            self._cache[profile] = state
+        return state
+
+    def get(self, profile: str = DEFAULT_PROFILE) -> dict:
+        with self._lock(profile):
+            return copy.deepcopy(self._cached(profile))
+
+    def update(self, profile: str, fn) -> dict:
+        """Atomically replace the state of a profile by ``fn(state)``."""
+        with self._lock(profile):
+            state = fn(copy.deepcopy(self._cached(profile)))
+            self._cache[profile] = copy.deepcopy(state)
+        with self._locks_lock:
+            self._dirty.add(profile)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return state
+
+    def flush(self):
+        """Write the changed profiles to the database."""
+        with self._flush_lock:
+            with self._locks_lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                profiles, self._dirty = self._dirty, set()
+            rows = []
+            for profile in profiles:
+                with self._lock(profile):
+                    state = self._cache.get(profile)
+                    if state is None:
+                        continue
+                    rows.append(
+                        (
+                            profile,
+                            int(state["counter"]),
+                            json.dumps(state["seen_videos"]),
+                            int(state["n_max_videos"]),
+                        )
+                    )
+            if not rows:
+                return
+            if self._writer is None:
+                # Flushes run on timer threads, which are new every time
+                self._writer = self._open(check_same_thread=False)
+            with metrics.timer("state_io"):
+                self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    self._writer.executemany(
+                        "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)", rows
+                    )
+                except BaseException:
+                    self._writer.execute("ROLLBACK")
+                    with self._locks_lock:
+                        self._dirty |= profiles
+                    raise
+                self._writer.execute("COMMIT")
+
+    def reset_all(self):
+        """Reset all profiles to the default state."""
+        with self._flush_lock:
+            with self._locks_lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self._dirty.clear()
+                self._cache.clear()
+            self._connect().execute("DELETE FROM profiles")
+
+    def close(self):
+        """Write pending changes and release the database.
+
+        Also drops the exit hook, so a store whose database is deleted later
+        (e.g. in a temporary folder) does not fail at interpreter exit.
+        """
+        self.flush()
+        atexit.unregister(self.flush)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,127 @@
+# %%
+
+import os
+import threading
+
+from .library import THUMBNAIL_EXTENSIONS
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - optional dependency
+    FileSystemEventHandler = object
+    Observer = None
+
+# %%
+
+WATCHED_EXTENSIONS = (".mp4", *THUMBNAIL_EXTENSIONS)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "LibraryWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.watcher.notify(os.fsdecode(path))
+
+
+class LibraryWatcher:
+    """Watch a processed videos folder and report changed clips.
+
+    Uses inotify (through the optional ``watchdog`` package) when available and
+    falls back to polling the folder listing otherwise. Events are debounced:
+    ``callback`` receives the set of clip base names that changed once no new
+    event arrived for ``debounce`` seconds.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        callback,
+        debounce: float = 1.0,
+        poll_interval: float = 2.0,
+    ):
+        self.folder = folder
+        self.thumbnail_folder = os.path.join(folder, "thumbnails")
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+        self._observer = None
+        self._stop = threading.Event()
+        self._poll_thread = None
+
+    def notify(self, path: str):
+        """Register a changed file and (re)start the debounce timer."""
+        name, extension = os.path.splitext(os.path.basename(path))
+        if extension.lower() not in WATCHED_EXTENSIONS:
+            return
+        directory = os.path.abspath(os.path.dirname(path))
+        if directory not in (
+            os.path.abspath(self.folder),
+            os.path.abspath(self.thumbnail_folder),
+        ):
+            return
+        with self._lock:
+            self._pending.add(name)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            names, self._pending = self._pending, set()
+            self._timer = None
+        if names:
+            self.callback(names)
+
+    def _snapshot(self) -> dict:
+        snapshot = {}
+        for folder in (self.folder, self.thumbnail_folder):
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            snapshot[entry.path] = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+        return snapshot
+
+    def _poll(self, previous: dict):
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self.notify(path)
+            previous = current
+
+    def start(self):
+        os.makedirs(self.thumbnail_folder, exist_ok=True)
+        if Observer is not None:
+            self._observer = Observer()
+            handler = _EventHandler(self)
+            self._observer.schedule(handler, self.folder, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(
+                target=self._poll, args=(self._snapshot(),), daemon=True
+            )
+            self._poll_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
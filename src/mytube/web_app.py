@@ -1,13 +1,21 @@
 # %%
 
+import bisect
 import datetime
-import glob
-import json
+import functools
 import os
 import importlib.metadata
+import math
+import threading
 
 import gradio as gr
-import matplotlib.pyplot as plt
+from fastapi.responses import PlainTextResponse
+
+from .library import RENDITIONS, LibraryIndex, find_thumbnail, rendition_path
+from .metrics import metrics
+from .prefetch import Prefetcher
+from .state import DEFAULT_PROFILE, ProfileStateStore
+from .watcher import LibraryWatcher
 
 now = datetime.datetime.now
 
@@ -29,6 +37,11 @@ class WebApp:
         finished_path: str = "videos/info/finished.mp4",
         color_done: str = "#fca903",
         color_undone: str = "#03fcdf",
+        page_size: int = 48,
+        watch: bool = True,
+        rendition: str = "auto",
+        prefetch_count: int = 2,
+        metrics_endpoint: bool = False,
     ):
         self.title = title
         self.information = information
@@ -36,30 +49,160 @@ class WebApp:
         self.n_max_videos = n_max_videos
         self.only_one_more_path = only_one_more_path
         self.finished_path = finished_path
-        self.video_files = sorted(glob.glob(f"{self.processed_videos_folder}/*.mp4"))
         self.thumbnail_folder = os.path.join(self.processed_videos_folder, "thumbnails")
-        self.thumbnails = self._get_thumbnails()
+        self.library = LibraryIndex(self.processed_videos_folder)
+        self.video_files, self.thumbnails = self._load_library()
+        self.library_version = 0
+        self._library_lock = threading.Lock()
+        self.watch = watch
+        self.rendition = rendition
+        self.prefetch_count = prefetch_count
+        self.metrics_endpoint = metrics_endpoint
+        self.prefetcher = Prefetcher()
+        self.watcher = None
         self.empty_thumbnail = os.path.join(
             os.path.dirname(__file__), "data", "finished.png"
         )
-        self.collection_thumbnails = [self.empty_thumbnail, *self.thumbnails]
+        self.page_size = max(1, int(page_size))
         self.color_done = color_done
         self.color_undone = color_undone
-        self.state_file = os.path.abspath("webapp_state.json")
+        self.state_file = os.path.abspath("webapp_state.sqlite")
         print(f"WebApp state file: {self.state_file}")
-        self._write_state(self._default_state())
+        self.state_store = ProfileStateStore(self.state_file, self._default_state())
+        self.state_store.reset_all()
         self.state = self._load_state()
 
-    def _get_thumbnails(self):
-        thumbnails = []
-        for video in self.video_files:
-            thumbnail_name = os.path.basename(video).replace(".mp4", ".png")
-            thumbnail_path = os.path.join(self.thumbnail_folder, thumbnail_name)
-            if os.path.exists(thumbnail_path):
-                thumbnails.append(thumbnail_path)
-            else:
-                self.video_files.remove(video)
-        return thumbnails
+    def _load_library(self):
+        """Load clips and thumbnails from the library index in one query.
+
+        The folder is not scanned here, see :meth:`sync_library`.
+        """
+        entries = self.library.entries()
+        video_files = [entry["video"] for entry in entries]
+        thumbnails = [entry["thumbnail"] for entry in entries]
+        return video_files, thumbnails
+
+    def _thumbnail_of(self, video: str) -> str | None:
+        idx = bisect.bisect_left(self.video_files, video)
+        if idx < len(self.video_files) and self.video_files[idx] == video:
+            return self.thumbnails[idx]
+        return None
+
+    def _clean_seen(self, raw_seen) -> list[str]:
+        """Keep the seen videos that are in the library.
+
+        Seen videos are stored as paths, so they stay valid when clips are added
+        or removed while the app runs. Indices from older state files are
+        converted to paths.
+        """
+        seen_videos = []
+        for candidate in raw_seen or []:
+            if isinstance(candidate, int) and not isinstance(candidate, bool):
+                if 0 <= candidate < len(self.video_files):
+                    seen_videos.append(self.video_files[candidate])
+            elif isinstance(candidate, str) and self._thumbnail_of(candidate):
+                seen_videos.append(candidate)
+        return seen_videos
+
+    def _seen_thumbnails(self, seen_videos) -> list[str]:
+        thumbnails = (self._thumbnail_of(video) for video in seen_videos or [])
+        return [thumbnail for thumbnail in thumbnails if thumbnail]
+
+    def apply_library_changes(self, names: set[str]):
+        """Add, update or remove the clips with the given base names.
+
+        Called by the library watcher. Both the in-memory lists and the index
+        are updated, and ``library_version`` is increased so that open pages
+        refresh their collection gallery.
+        """
+        with self._library_lock:
+            video_files = list(self.video_files)
+            thumbnails = list(self.thumbnails)
+            for name in names:
+                video = os.path.join(self.processed_videos_folder, f"{name}.mp4")
+                thumbnail = find_thumbnail(self.thumbnail_folder, video)
+                idx = bisect.bisect_left(video_files, video)
+                present = idx < len(video_files) and video_files[idx] == video
+                if os.path.exists(video) and thumbnail is not None:
+                    if present:
+                        thumbnails[idx] = thumbnail
+                    else:
+                        video_files.insert(idx, video)
+                        thumbnails.insert(idx, thumbnail)
+                    self.library.add(video, thumbnail)
+                elif present:
+                    del video_files[idx]
+                    del thumbnails[idx]
+                    self.library.remove(video)
+            self.video_files, self.thumbnails = video_files, thumbnails
+            self.library_version += 1
+
+    def sync_library(self):
+        """Reconcile the index with the folder and apply the changes found.
+
+        Picks up clips that were added, replaced or deleted without going
+        through the index. Runs on a background thread after launch, so the
+        folder scan does not delay startup.
+        """
+        changed = self.library.sync()
+        if changed:
+            self.apply_library_changes(changed)
+
+    def refresh_collection(self, version: int, page: int):
+        """Refresh the collection page if the library changed since ``version``."""
+        if version == self.library_version:
+            return version, gr.update(), gr.update(), gr.update(), gr.update()
+        page_videos, items = self.page_items(page)
+        return (
+            self.library_version,
+            gr.update(value=items),
+            self.page_label(page),
+            gr.update(visible=self.n_pages > 1),
+            page_videos,
+        )
+
+    @property
+    def n_pages(self) -> int:
+        return max(1, -(-len(self.thumbnails) // self.page_size))
+
+    def _clamp_page(self, page) -> int:
+        try:
+            page = int(page)
+        except (TypeError, ValueError):
+            page = 0
+        return max(0, min(page, self.n_pages - 1))
+
+    def page_items(self, page: int) -> tuple[list[str], list[str]]:
+        """Return the videos and the gallery items of one collection page.
+
+        The first item is always the placeholder thumbnail, which the player
+        selects to reset the gallery after a video ends. The videos are kept
+        with the rendered page, so a click is resolved against what the browser
+        shows even if the library changed since.
+        """
+        page = self._clamp_page(page)
+        start = page * self.page_size
+        with self._library_lock:
+            videos = self.video_files[start : start + self.page_size]
+            thumbnails = self.thumbnails[start : start + self.page_size]
+        return videos, [self.empty_thumbnail, *thumbnails]
+
+    def collection_page(self, page: int) -> list[str]:
+        """Return the gallery items of one collection page."""
+        return self.page_items(page)[1]
+
+    def page_label(self, page: int) -> str:
+        return f"Page {self._clamp_page(page) + 1} of {self.n_pages}"
+
+    def change_page(self, page: int, step: int):
+        page = self._clamp_page(self._clamp_page(page) + step)
+        page_videos, items = self.page_items(page)
+        return (
+            page,
+            gr.update(value=items, selected_index=None),
+            self.page_label(page),
+            page_videos,
+        )
 
     def _default_state(self):
         return {
@@ -68,76 +211,96 @@ class WebApp:
             "n_max_videos": self.n_max_videos,
         }
 
-    def _load_state(self):
-        if not os.path.exists(self.state_file):
-            state = self._default_state()
-            self._write_state(state)
-            return state
-        try:
-            with open(self.state_file, "r", encoding="utf-8") as f:
-                state = json.load(f)
-        except (json.JSONDecodeError, OSError):
-            state = self._default_state()
-        stored_limit = state.get("n_max_videos", self.n_max_videos)
+    def choose_rendition(self, video: str, request: gr.Request | None = None) -> str:
+        """Return the file to play for a clip.
+
+        With ``rendition="auto"`` the choice uses the client hints of the
+        request: ``Save-Data`` picks the smallest rendition, ``Downlink`` (in
+        Mbit/s) the largest rendition that fits, and mobile or tablet browsers
+        get the largest rendition. Desktop browsers get the original. Clips
+        without renditions are always played as they are.
+        """
+        if self.rendition == "original":
+            return video
+        available = [
+            (name, rendition_path(video, name), RENDITIONS[name][1])
+            for name in sorted(RENDITIONS, key=lambda n: -RENDITIONS[n][1])
+        ]
+        available = [item for item in available if os.path.exists(item[1])]
+        if not available:
+            return video
+        if self.rendition != "auto":
+            for name, path, _ in available:
+                if name == self.rendition:
+                    return path
+            return video
+        headers = getattr(request, "headers", None) or {}
+        if headers.get("save-data", "").lower() == "on":
+            return available[-1][1]
         try:
-            stored_limit = int(stored_limit)
-        except (TypeError, ValueError):
-            stored_limit = self.n_max_videos
-        if stored_limit > 0:
-            self.n_max_videos = stored_limit
-        counter = int(state.get("counter", 0))
-        counter = max(0, min(counter, self.n_max_videos))
-        raw_seen = state.get("seen_videos", [])
-        seen_videos = []
-        for candidate in raw_seen:
-            try:
-                idx = int(candidate)
-            except (TypeError, ValueError):
-                continue
-            if 0 <= idx < len(self.thumbnails):
-                seen_videos.append(idx)
-        if len(seen_videos) > counter:
-            seen_videos = seen_videos[:counter]
-        clean_state = {
-            "counter": counter,
-            "seen_videos": seen_videos,
-            "n_max_videos": self.n_max_videos,
-        }
-        self._write_state(clean_state)
-        return clean_state
+            downlink = float(headers.get("downlink", ""))
+        except ValueError:
+            downlink = None
+        if downlink is not None:
+            if downlink >= 5:
+                return video
+            for _, path, bitrate in available:
+                if bitrate * 1.5 <= downlink * 1000:
+                    return path
+            return available[-1][1]
+        user_agent = headers.get("user-agent", "")
+        if any(key in user_agent for key in ("Mobi", "Android", "iPad", "Tablet")):
+            return available[0][1]
+        return video
+
+    def prefetch_next(self, video_idx: int, request: gr.Request | None = None):
+        """Warm the start of the clips following ``video_idx`` on its page.
+
+        The following thumbnails are the most likely next picks, and the file
+        that would be played for this client is the one that gets warmed.
+        """
+        page_end = (video_idx // self.page_size + 1) * self.page_size
+        stop = min(video_idx + 1 + self.prefetch_count, page_end, len(self.video_files))
+        candidates = self.video_files[video_idx + 1 : stop]
+        self.prefetcher.warm(
+            [self.choose_rendition(video, request) for video in candidates]
+        )
 
-    def _write_state(self, state):
-        try:
-            with open(self.state_file, "w", encoding="utf-8") as f:
-                json.dump(state, f)
-        except OSError:
-            pass
-        else:
-            self.state = state
+    @staticmethod
+    def _profile(request: gr.Request | None) -> str:
+        """Return the profile of a session, given as ``?profile=<name>``."""
+        params = getattr(request, "query_params", None) or {}
+        profile = str(params.get("profile", "") or "").strip()[:64]
+        return profile or DEFAULT_PROFILE
 
-    def _prepare_state_payload(self):
-        state = self._load_state()
-        counter = int(state.get("counter", 0))
+    def _clean_state(self, state: dict) -> dict:
         try:
             limit = int(state.get("n_max_videos", self.n_max_videos))
         except (TypeError, ValueError):
             limit = self.n_max_videos
         if limit <= 0:
             limit = max(1, self.n_max_videos)
-        self.n_max_videos = limit
+        try:
+            counter = int(state.get("counter", 0))
+        except (TypeError, ValueError):
+            counter = 0
         counter = max(0, min(counter, limit))
-        raw_seen = state.get("seen_videos", [])
-        seen_videos = []
-        for candidate in raw_seen:
-            try:
-                idx = int(candidate)
-            except (TypeError, ValueError):
-                continue
-            if 0 <= idx < len(self.thumbnails):
-                seen_videos.append(idx)
-        if len(seen_videos) > counter:
-            seen_videos = seen_videos[:counter]
-        thumbnails_seen = [self.thumbnails[i] for i in seen_videos]
+        seen_videos = self._clean_seen(state.get("seen_videos", []))
+        return {
+            "counter": counter,
+            "seen_videos": seen_videos[:counter],
+            "n_max_videos": limit,
+        }
+
+    def _load_state(self, profile: str = DEFAULT_PROFILE):
+        return self._clean_state(self.state_store.get(profile))
+
+    def _state_payload(self, profile: str):
+        state = self._load_state(profile)
+        counter = state["counter"]
+        limit = state["n_max_videos"]
+        seen_videos = state["seen_videos"]
+        thumbnails_seen = self._seen_thumbnails(seen_videos)
         gallery_columns = limit if limit > 0 else 1
         progress_plot = self.gen_progress_plot(limit, counter)
         display_max_value = str(limit)
@@ -152,30 +315,11 @@ class WebApp:
             progress_plot,
             display_max_value,
             gr.update(value=radio_value),
+            profile,
         )
 
-    def _save_state(self, counter, seen_videos, n_max_videos=None):
-        limit = n_max_videos if n_max_videos is not None else self.n_max_videos
-        try:
-            limit = int(limit)
-        except (TypeError, ValueError):
-            limit = self.n_max_videos
-        if limit > 0:
-            self.n_max_videos = limit
-        cleaned_seen = []
-        for candidate in seen_videos:
-            try:
-                idx = int(candidate)
-            except (TypeError, ValueError):
-                continue
-            if 0 <= idx < len(self.thumbnails):
-                cleaned_seen.append(idx)
-        state = {
-            "counter": max(0, min(int(counter), self.n_max_videos)),
-            "seen_videos": cleaned_seen,
-            "n_max_videos": self.n_max_videos,
-        }
-        self._write_state(state)
+    def _prepare_state_payload(self, request: gr.Request = None):
+        return self._state_payload(self._profile(request))
 
     def check_video_counter(self, counter: int, video: str, n_max_videos: int):
         if counter > n_max_videos:
@@ -189,6 +333,10 @@ class WebApp:
         counter: int,
         n_max_videos: int,
         seen_videos: list,
+        page: int = 0,
+        profile: str = DEFAULT_PROFILE,
+        page_videos: list | None = None,
+        request: gr.Request = None,
     ):
         try:
             current_limit = int(n_max_videos)
@@ -213,7 +361,13 @@ class WebApp:
             if isinstance(first_value, int):
                 idx = first_value
 
-        if idx is None or not (0 <= idx < len(self.collection_thumbnails)):
+        if page_videos is None:
+            page_videos = self.page_items(page)[0]
+        # The clip may have been removed since the page was rendered
+        if idx is not None and 0 < idx <= len(page_videos):
+            if self._thumbnail_of(page_videos[idx - 1]) is None:
+                idx = None
+        if idx is None or not (0 <= idx <= len(page_videos)):
             progress_plot = self.gen_progress_plot(current_limit, counter)
             yield counter, gr.update(), gr.update(), seen_videos, progress_plot
             return
@@ -229,21 +383,36 @@ class WebApp:
             )
             return
 
-        video_idx = idx - 1
+        video = page_videos[idx - 1]
+        accepted = []
+
+        def watch_video(state):
+            # Counter and limit are checked on the stored row, so two devices
+            # of the same profile cannot both take the last video.
+            state = self._clean_state(state)
+            if state["counter"] < state["n_max_videos"]:
+                state["counter"] += 1
+                state["seen_videos"].append(video)
+                accepted.append(video)
+            return state
 
-        if counter < current_limit:
-            counter += 1
-            seen_videos.append(video_idx)
+        state = self.state_store.update(profile, watch_video)
+        counter = state["counter"]
+        current_limit = state["n_max_videos"]
+        seen_videos = state["seen_videos"]
+        if accepted:
+            metrics.count("videos_played")
+            self.prefetch_next(bisect.bisect_left(self.video_files, video), request)
             video_update = gr.update(
-                value=self.video_files[video_idx], visible=True, autoplay=True
+                value=self.choose_rendition(video, request),
+                visible=True,
+                autoplay=True,
             )
             tabs_update = gr.update(selected=self.TAB_VIDEO)
         else:
-            counter = current_limit
             video_update = gr.update(value=None, visible=False, autoplay=False)
             tabs_update = gr.update(selected=self.TAB_INFO)
         progress_plot = self.gen_progress_plot(current_limit, counter)
-        self._save_state(counter, seen_videos, current_limit)
 
         # Force the browser video element to fully reset before loading the next
         # source to avoid getting stuck in the "loading" overlay while audio plays.
@@ -339,51 +508,91 @@ class WebApp:
             reset_gallery,
         )
 
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _render_pie(
+        n_total: int, n_done: int, done_color: str, undone_color: str
+    ) -> str:
+        """Render a pie of ``n_total`` equal slices as an SVG string.
+
+        The first ``n_done`` slices use ``done_color``. Slices start at three
+        o'clock and go counterclockwise, like matplotlib's default pie.
+        """
+        size, radius = 200, 96
+        center = size / 2
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+            'width="100%" style="max-width: 320px">'
+        ]
+        for i in range(n_total):
+            color = done_color if i < n_done else undone_color
+            if n_total == 1:
+                parts.append(
+                    f'<circle cx="{center}" cy="{center}" r="{radius}" '
+                    f'fill="{color}" stroke="black"/>'
+                )
+                continue
+            a_1 = 2 * math.pi * i / n_total
+            a_2 = 2 * math.pi * (i + 1) / n_total
+            x_1 = center + radius * math.cos(a_1)
+            y_1 = center - radius * math.sin(a_1)
+            x_2 = center + radius * math.cos(a_2)
+            y_2 = center - radius * math.sin(a_2)
+            large_arc = 1 if a_2 - a_1 > math.pi else 0
+            parts.append(
+                f'<path d="M {center} {center} L {x_1:.2f} {y_1:.2f} '
+                f'A {radius} {radius} 0 {large_arc} 0 {x_2:.2f} {y_2:.2f} Z" '
+                f'fill="{color}" stroke="black"/>'
+            )
+        parts.append("</svg>")
+        return "".join(parts)
+
     def gen_progress_plot(self, n_total: int, n_done: int):
-        # Define colors for "done" and "undone" sections
-        done_color = self.color_done
-        undone_color = self.color_undone
-        colors = [done_color] * n_done + [undone_color] * (n_total - n_done)
-
-        # Define values and labels
-        values = [1] * n_total  # Equal slices
-        labels = [""] * n_total  # No labels
-
-        # Create the pie chart
-        fig, ax = plt.subplots()
-        wedges, texts = ax.pie(
-            values,
-            colors=colors,
-            labels=labels,
-            wedgeprops=dict(edgecolor="black"),  # Black borders for visibility
-        )
+        """Return the progress pie as SVG markup.
 
-        return fig
+        Charts are cached by ``(n_total, n_done, colors)``, so event handlers
+        only look up a string instead of rendering a figure.
+        """
+        n_total = max(0, int(n_total))
+        n_done = max(0, min(int(n_done), n_total))
+        return self._render_pie(n_total, n_done, self.color_done, self.color_undone)
 
-    def update_max_videos(self, n_max_videos: int, counter: int, seen_videos: list):
-        seen_videos = list(seen_videos or [])
-        self._save_state(counter, seen_videos, n_max_videos)
-        return self._prepare_state_payload()
+    def update_max_videos(
+        self,
+        n_max_videos: int,
+        counter: int,
+        seen_videos: list,
+        profile: str = DEFAULT_PROFILE,
+    ):
+        def set_limit(state):
+            return self._clean_state(dict(state, n_max_videos=n_max_videos))
+
+        self.state_store.update(profile, set_limit)
+        return self._state_payload(profile)
 
-    def undo_last_video(self, counter: int, seen_videos: list, n_max_videos: int):
+    def undo_last_video(
+        self,
+        counter: int,
+        seen_videos: list,
+        n_max_videos: int,
+        profile: str = DEFAULT_PROFILE,
+    ):
         """Remove the most recent selection and roll back counter/state."""
-        seen_videos = list(seen_videos or [])
-        try:
-            limit = int(n_max_videos)
-        except (TypeError, ValueError):
-            limit = self.n_max_videos
-        if limit <= 0:
-            limit = max(1, self.n_max_videos)
 
-        if counter > 0:
-            counter -= 1
-        if seen_videos:
-            seen_videos = seen_videos[:-1]
+        def undo(state):
+            state = self._clean_state(state)
+            if state["counter"] > 0:
+                state["counter"] -= 1
+            state["seen_videos"] = state["seen_videos"][: state["counter"]]
+            return state
 
-        self._save_state(counter, seen_videos, limit)
+        state = self.state_store.update(profile, undo)
+        counter = state["counter"]
+        seen_videos = state["seen_videos"]
+        limit = state["n_max_videos"]
 
         seen_gallery = gr.update(
-            value=[self.thumbnails[i] for i in seen_videos] or None,
+            value=self._seen_thumbnails(seen_videos) or None,
             columns=limit if limit > 0 else 1,
         )
         progress_plot = self.gen_progress_plot(limit, counter)
@@ -412,12 +621,21 @@ class WebApp:
         ## Get version from package metadata from .toml file
         version = importlib.metadata.version("mytube")
 
+        # Ask browsers for the Downlink and Save-Data client hints used to pick
+        # a rendition.
+        head = '<meta http-equiv="Accept-CH" content="Downlink, Save-Data">'
+
         with gr.Blocks() as demo:
             # State
             st_counter = gr.State(value=self.state.get("counter", 0))
             st_start = gr.State(value=now())
             st_n_max_videos = gr.State(value=self.n_max_videos)
             st_seen_videos = gr.State(value=self.state.get("seen_videos", []))
+            st_page = gr.State(value=0)
+            st_profile = gr.State(value=DEFAULT_PROFILE)
+            st_library_version = gr.State(value=self.library_version)
+            page_videos, page_items = self.page_items(0)
+            st_page_videos = gr.State(value=page_videos)
             # Layout
             gr.Markdown(f"## {self.title}")
             if self.information:
@@ -428,11 +646,15 @@ class WebApp:
                     with gr.Tabs() as tabs:
                         with gr.Tab(label="Collection", id=self.TAB_COLLECTION):
                             thumbnail_gallery = gr.Gallery(
-                                self.collection_thumbnails,
+                                page_items,
                                 label="Thumbnails",
                                 allow_preview=False,
                                 columns=5,
                             )
+                            with gr.Row(visible=self.n_pages > 1) as pages_row:
+                                previous_page_btn = gr.Button("Previous")
+                                display_page = gr.Markdown(self.page_label(0))
+                                next_page_btn = gr.Button("Next")
                         with gr.Tab(label="Video", id=self.TAB_VIDEO):
                             video = gr.Video(
                                 value=None, scale=3, autoplay=True, visible=True
@@ -451,19 +673,14 @@ class WebApp:
                         interactive=False,
                         elem_classes="info2",
                     )
-                    progress_plot = gr.Plot(
+                    progress_plot = gr.HTML(
                         value=self.gen_progress_plot(
                             self.state.get("n_max_videos", self.n_max_videos),
                             self.state.get("counter", 0),
                         )
                     )
             display_seen_videos = gr.Gallery(
-                [
-                    self.thumbnails[i]
-                    for i in self.state.get("seen_videos", [])
-                    if 0 <= i < len(self.thumbnails)
-                ]
-                or None,
+                self._seen_thumbnails(self.state.get("seen_videos", [])) or None,
                 label="Seen videos",
                 interactive=False,
                 columns=self.state.get("n_max_videos", self.n_max_videos),
@@ -500,6 +717,7 @@ class WebApp:
                     progress_plot,
                     display_max,
                     parental_max_videos,
+                    st_profile,
                 ],
             )
 
@@ -515,9 +733,41 @@ class WebApp:
                 outputs=[tabs, video, info_video, thumbnail_gallery],
             )
 
+            if self.watch:
+                gr.Timer(value=5).tick(
+                    fn=self.refresh_collection,
+                    inputs=[st_library_version, st_page],
+                    outputs=[
+                        st_library_version,
+                        thumbnail_gallery,
+                        display_page,
+                        pages_row,
+                        st_page_videos,
+                    ],
+                )
+
+            previous_page_btn.click(
+                fn=lambda page: self.change_page(page, -1),
+                inputs=st_page,
+                outputs=[st_page, thumbnail_gallery, display_page, st_page_videos],
+            )
+
+            next_page_btn.click(
+                fn=lambda page: self.change_page(page, 1),
+                inputs=st_page,
+                outputs=[st_page, thumbnail_gallery, display_page, st_page_videos],
+            )
+
             thumbnail_gallery.select(
                 fn=self.select_thumbnail,
-                inputs=[st_counter, st_n_max_videos, st_seen_videos],
+                inputs=[
+                    st_counter,
+                    st_n_max_videos,
+                    st_seen_videos,
+                    st_page,
+                    st_profile,
+                    st_page_videos,
+                ],
                 outputs=[st_counter, video, tabs, st_seen_videos, progress_plot],
             ).then(
                 fn=lambda x: str(x),
@@ -525,7 +775,7 @@ class WebApp:
                 outputs=display_counter,
             ).then(
                 fn=lambda seen, limit: gr.update(
-                    value=[self.thumbnails[i] for i in (seen or [])],
+                    value=self._seen_thumbnails(seen),
                     columns=limit if limit > 0 else 1,
                 ),
                 inputs=[st_seen_videos, st_n_max_videos],
@@ -540,7 +790,7 @@ class WebApp:
 
             parental_max_videos.select(
                 fn=self.update_max_videos,
-                inputs=[parental_max_videos, st_counter, st_seen_videos],
+                inputs=[parental_max_videos, st_counter, st_seen_videos, st_profile],
                 outputs=[
                     st_counter,
                     st_n_max_videos,
@@ -550,12 +800,13 @@ class WebApp:
                     progress_plot,
                     display_max,
                     parental_max_videos,
+                    st_profile,
                 ],
             )
 
             undo_last_video_btn.click(
                 fn=self.undo_last_video,
-                inputs=[st_counter, st_seen_videos, st_n_max_videos],
+                inputs=[st_counter, st_seen_videos, st_n_max_videos, st_profile],
                 outputs=[
                     st_counter,
                     st_seen_videos,
@@ -567,9 +818,38 @@ class WebApp:
                 ],
             )
 
+        self.prefetcher.pin([self.only_one_more_path, self.finished_path])
+
+        if self.watch and self.watcher is None:
+            self.watcher = LibraryWatcher(
+                self.processed_videos_folder, self.apply_library_changes
+            )
+            self.watcher.start()
+
         demo.launch(
             inbrowser=inbrowser,
             server_name=server_name,
             server_port=server_port,
             css=css,
+            head=head,
+            prevent_thread_lock=True,
         )
+        threading.Thread(
+            target=self.sync_library, name="library-sync", daemon=True
+        ).start()
+        if self.metrics_endpoint:
+            # Unauthenticated Prometheus text endpoint with the metrics of this
+            # process, off by default
+            demo.app.add_api_route(
+                "/metrics",
+                lambda: PlainTextResponse(metrics.to_prometheus()),
+                methods=["GET"],
+            )
+        demo.block_thread()
+
+    def close(self):
+        """Stop the library watcher and write and close the profile state."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.state_store.close()